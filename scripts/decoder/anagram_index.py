@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+ Letter-histogram index for sub-anagrams queries.
+
+ Each word of the word vectors vocabulary is kept as a vector of counts of the 22 Hebrew letters
+  (final letters are counted as their regular form), with the index of the word in the vocabulary.
+ The words are bucketed by their words length pattern (e.g. (5,) for a word of 5 letters),
+  so a query scans only the words that fit to the length of the answer.
+ Given the pool of letters of a clue, a query returns all the words whose letters are a sub-multiset of the pool,
+  using one vectorized comparison of the counts of the bucket, instead of enumerating subsets and permutations of the letters.
+ The titles are not indexed, the titles of an anagram are found by a lookup of its letters in the anagrams dictionary.
+ As the vocabulary signatures below, the index is saved into a word vectors store and memory-mapped on the next runs.
+
+ The sorted letters signature of a word is the same as sortedAnagramLetters of the JS app (and the anagrams dictionary keys).
+
+ The vocabulary signatures index maps the sorted letters signature to the vocabulary words with exactly these letters,
+  so the vocabulary anagrams of a signature are found by one dictionary lookup. It is built when the suggester starts,
+  and with a word vectors store it is saved into the store directory (for all the words of the store), and loaded on the next runs
+  (until the store is written again, see the fingerprint of the store in vectors_store.py).
+"""
+
+import codecs
+import json
+import os.path
+import re
+
+import numpy
+
+from vectors_store import loadStore, isDerivedFresh, saveDerivedFingerprint
+
+REGULAR_LETTERS = u'אבגדהוזחטיכלמנסעפצקרשת'
+FINAL_LETTERS = { u'ך': u'כ', u'ם': u'מ', u'ן': u'נ', u'ף': u'פ', u'ץ': u'צ' }
+
+LETTER_INDEX = dict((letter, index) for index, letter in enumerate(REGULAR_LETTERS))
+for final_letter, regular_letter in FINAL_LETTERS.items():
+    LETTER_INDEX[final_letter] = LETTER_INDEX[regular_letter]
+
+# letter index of each code point from aleph (final letters are mapped to their regular form)
+CODE_POINTS_LETTERS = numpy.array([LETTER_INDEX.get(chr(ord(u'א') + i), 0) for i in range(ord(u'ת') - ord(u'א') + 1)], dtype=numpy.intp)
+HEBREW_WORDS = re.compile(u'[א-ת]+( [א-ת]+)*$')
+HEBREW_WORD = re.compile(u'[א-ת]+$')
+REGULAR_FORM = dict((ord(final_letter), regular_letter) for final_letter, regular_letter in FINAL_LETTERS.items())
+
+SIGNATURES_KEYS_FILE = 'signatures-keys.txt'
+SIGNATURES_OFFSETS_FILE = 'signatures-offsets.npy'
+SIGNATURES_IDS_FILE = 'signatures-ids.npy'
+SIGNATURES_INDEX_NAME = 'signatures'
+
+SUB_ANAGRAMS_IDS_FILE = 'subanagrams-ids.npy'
+SUB_ANAGRAMS_COUNTS_FILE = 'subanagrams-counts.npy'
+SUB_ANAGRAMS_BUCKETS_FILE = 'subanagrams-buckets.json'
+SUB_ANAGRAMS_INDEX_NAME = 'subanagrams'
+
+# Counts of the Hebrew letters in the words, or None if a word contains other characters
+def lettersCounts(words):
+    counts = numpy.zeros(len(REGULAR_LETTERS), dtype=numpy.uint8)
+    for word in words:
+        for letter in word:
+            if letter not in LETTER_INDEX:
+                return None
+            counts[LETTER_INDEX[letter]] += 1
+    return counts
+
+# Counts matrix of entries with the same total length, all the letters are counted at once
+def lettersCountsOfEntries(entries, total_length):
+    letters = u''.join(entry.replace(u' ', u'') for entry in entries)
+    code_points = numpy.frombuffer(letters.encode('utf-32-le'), dtype=numpy.uint32).astype(numpy.intp) - ord(u'א')
+    rows = numpy.repeat(numpy.arange(len(entries)), total_length)
+    counts = numpy.bincount(rows * len(REGULAR_LETTERS) + CODE_POINTS_LETTERS[code_points],
+                            minlength=len(entries) * len(REGULAR_LETTERS))
+    return counts.reshape(len(entries), len(REGULAR_LETTERS)).astype(numpy.uint8)
+
+# Sorted letters of the counts, in the form of the anagrams dictionary keys
+def sortedLetters(counts):
+    return u''.join(letter * int(count) for letter, count in zip(REGULAR_LETTERS, counts))
+
+# Sorted letters of a word in regular form, the same as sortedLetters of its counts
+def signatureOf(word):
+    return u''.join(sorted(word.translate(REGULAR_FORM)))
+
+class SubAnagramIndex(object):
+    # ids - the indices of the vocabulary words, grouped by their words length pattern (ascending in each group),
+    # counts - the letters counts matrix of the words in the same order, buckets - pattern: (start, end).
+    # Words over the vectors limit (the length of index2word) are the last words of each bucket, and they are cut.
+    def __init__(self, index2word, ids, counts, buckets):
+        self.index2word = index2word
+        self.ids = ids
+        self.counts = counts
+        limit = len(index2word)
+        self.buckets = dict((pattern, (start, start + int(numpy.searchsorted(ids[start:end], limit))))
+                            for pattern, (start, end) in buckets.items())
+
+    # All the vocabulary words with the given words length pattern, whose letters are a sub-multiset of the pool letters.
+    # Returns a list of (word, sorted letters)
+    def subAnagrams(self, pool_words, words_length):
+        pattern = tuple(int(length) for length in words_length)
+        pool = lettersCounts(pool_words)
+        if pattern not in self.buckets or pool is None:
+            return []
+        start, end = self.buckets[pattern]
+        counts = self.counts[start:end]
+        matches = numpy.flatnonzero(numpy.all(counts <= pool, axis=1))
+        return [(self.index2word[self.ids[start + i]], sortedLetters(counts[i])) for i in matches]
+
+# Letters counts of the vocabulary words, returns the ids, counts and buckets of SubAnagramIndex.
+# Words with characters other than Hebrew letters are ignored.
+def subAnagramBuckets(index2word):
+    patterns = {}
+    for index, word in enumerate(index2word):
+        if HEBREW_WORDS.match(word):
+            patterns.setdefault(tuple(len(part) for part in word.split(u' ')), []).append(index)
+    ids, counts, buckets = [], [], {}
+    for pattern, pattern_ids in sorted(patterns.items()):
+        buckets[pattern] = (len(ids), len(ids) + len(pattern_ids))
+        counts.append(lettersCountsOfEntries([index2word[index] for index in pattern_ids], sum(pattern)))
+        ids.extend(pattern_ids)
+    counts = numpy.vstack(counts) if counts else numpy.zeros((0, len(REGULAR_LETTERS)), dtype=numpy.uint8)
+    return numpy.array(ids, dtype=numpy.int64), counts, buckets
+
+def hasSubAnagramIndex(store_path):
+    return (os.path.isfile(os.path.join(store_path, SUB_ANAGRAMS_BUCKETS_FILE)) and
+            isDerivedFresh(store_path, SUB_ANAGRAMS_INDEX_NAME))
+
+def saveSubAnagramIndex(store_path, ids, counts, buckets):
+    numpy.save(os.path.join(store_path, SUB_ANAGRAMS_IDS_FILE), ids)
+    numpy.save(os.path.join(store_path, SUB_ANAGRAMS_COUNTS_FILE), counts)
+    saved_buckets = [[list(pattern), start, end] for pattern, (start, end) in sorted(buckets.items())]
+    with codecs.open(os.path.join(store_path, SUB_ANAGRAMS_BUCKETS_FILE), 'w', 'utf-8') as f:
+        json.dump(saved_buckets, f)
+    saveDerivedFingerprint(store_path, SUB_ANAGRAMS_INDEX_NAME)
+
+def loadSubAnagramIndex(store_path):
+    with codecs.open(os.path.join(store_path, SUB_ANAGRAMS_BUCKETS_FILE), 'r', 'utf-8') as f:
+        buckets = dict((tuple(pattern), (start, end)) for pattern, start, end in json.load(f))
+    ids = numpy.load(os.path.join(store_path, SUB_ANAGRAMS_IDS_FILE), mmap_mode='r')
+    counts = numpy.load(os.path.join(store_path, SUB_ANAGRAMS_COUNTS_FILE), mmap_mode='r').view(numpy.ndarray)
+    return ids, counts, buckets
+
+# Use the saved sub-anagrams index of a store if exists, otherwise build it (and save it into the store)
+def createSubAnagramIndex(word_vectors, wv_file, logger):
+    if os.path.isdir(wv_file) and hasSubAnagramIndex(wv_file):
+        ids, counts, buckets = loadSubAnagramIndex(wv_file)
+    else:
+        logger.info("building sub-anagrams index...")
+        if os.path.isdir(wv_file):
+            # all the words of the store, the vectors limit is applied when the index is loaded
+            ids, counts, buckets = subAnagramBuckets(loadStore(wv_file).index2word)
+            saveSubAnagramIndex(wv_file, ids, counts, buckets)
+            logger.info("sub-anagrams index was saved into " + wv_file)
+        else:
+            ids, counts, buckets = subAnagramBuckets(word_vectors.index2word)
+    return SubAnagramIndex(word_vectors.index2word, ids, counts, buckets)
+
+# Pool of letters of a clue - the words of the first anagram division contain all the words of the clue
+def clueWords(anagram_divisions):
+    for division in anagram_divisions:
+        return division.get("firstPart", []) + division.get("secondPart", [])
+    return []
+
+# Group sub-anagrams by their sorted letters
+def groupBySortedLetters(sub_anagrams):
+    groups = {}
+    for word, sorted_letters in sub_anagrams:
+        groups.setdefault(sorted_letters, []).append(word)
+    return groups
+
+class VocabularySignatures(object):
+    # signatures - sorted letters: (start, end) in ids, ids - the indices of the vocabulary words of each signature (ascending),
+    # words over the vectors limit (the length of index2word) are ignored
+    def __init__(self, index2word, signatures, ids):
+        self.index2word = index2word
+        self.signatures = signatures
+        self.ids = ids
+
+    # The vocabulary words whose sorted letters are the given signature
+    def words(self, sorted_letters):
+        if sorted_letters not in self.signatures:
+            return []
+        start, end = self.signatures[sorted_letters]
+        limit = len(self.index2word)
+        return [self.index2word[index] for index in self.ids[start:end].tolist() if index < limit]
+
+# Signatures of the Hebrew words of the vocabulary, returns the signatures and ids of VocabularySignatures
+def vocabularySignatures(index2word):
+    groups = {}
+    for index, word in enumerate(index2word):
+        if HEBREW_WORD.match(word):
+            groups.setdefault(signatureOf(word), []).append(index)
+    signatures, ids = {}, []
+    for signature, group in groups.items():
+        signatures[signature] = (len(ids), len(ids) + len(group))
+        ids.extend(group)
+    return signatures, numpy.array(ids, dtype=numpy.int64)
+
+def hasVocabularySignatures(store_path):
+    return (os.path.isfile(os.path.join(store_path, SIGNATURES_OFFSETS_FILE)) and
+            isDerivedFresh(store_path, SIGNATURES_INDEX_NAME))
+
+def saveVocabularySignatures(store_path, signatures, ids):
+    keys = sorted(signatures, key=lambda signature: signatures[signature][0])
+    offsets = numpy.array([signatures[signature][0] for signature in keys] + [len(ids)], dtype=numpy.int64)
+    with codecs.open(os.path.join(store_path, SIGNATURES_KEYS_FILE), 'w', 'utf-8') as f:
+        f.write(u'\n'.join(keys))
+    numpy.save(os.path.join(store_path, SIGNATURES_IDS_FILE), ids)
+    # offsets file is written last, signatures without it are incomplete
+    numpy.save(os.path.join(store_path, SIGNATURES_OFFSETS_FILE), offsets)
+    saveDerivedFingerprint(store_path, SIGNATURES_INDEX_NAME)
+
+def loadVocabularySignatures(store_path):
+    with codecs.open(os.path.join(store_path, SIGNATURES_KEYS_FILE), 'r', 'utf-8') as f:
+        keys = f.read().split(u'\n')
+    offsets = numpy.load(os.path.join(store_path, SIGNATURES_OFFSETS_FILE)).tolist()
+    ids = numpy.load(os.path.join(store_path, SIGNATURES_IDS_FILE), mmap_mode='r')
+    return dict(zip(keys, zip(offsets[:-1], offsets[1:]))), ids
+
+# Use the saved signatures of a store if exist, otherwise build them (and save them into the store)
+def createVocabularySignatures(word_vectors, wv_file, logger):
+    if os.path.isdir(wv_file) and hasVocabularySignatures(wv_file):
+        signatures, ids = loadVocabularySignatures(wv_file)
+    else:
+        logger.info("building vocabulary signatures index...")
+        if os.path.isdir(wv_file):
+            # all the words of the store, the vectors limit is applied when the signatures are used
+            signatures, ids = vocabularySignatures(loadStore(wv_file).index2word)
+            saveVocabularySignatures(wv_file, signatures, ids)
+            logger.info("vocabulary signatures were saved into " + wv_file)
+        else:
+            signatures, ids = vocabularySignatures(word_vectors.index2word)
+    return VocabularySignatures(word_vectors.index2word, signatures, ids)
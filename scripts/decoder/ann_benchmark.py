@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ Recall and latency of the approximate nearest neighbours index (see ann_index.py) compared to the exact index.
+
+ The queries are the nearest neighbours queries of a divisions file (as collected by the suggester):
+  each word of a multiword division, and each combined division, both plain cosine and 3CosMul.
+ Each query is searched by the exact length index, and by the approximate index with each given nprobe.
+ recall@k is the part of the exact top-k candidates that the approximate query returned.
+ The results are logged, and saved into ann-benchmark-<time>.json.
+
+     python ann_benchmark.py <wordvec-file> <vectors-limit> <definitions-divisions-file> [<nprobe> ...]
+"""
+
+import codecs
+import json
+import logging
+import os.path
+import sys
+import time
+from datetime import datetime
+
+import numpy
+
+from vectors_store import isStore, loadStore
+from similarity_index import createLengthIndex
+from ann_index import createIVFIndex
+from batch_index import collectQueries
+
+TOP_K = 10
+DEFAULT_NPROBES = [1, 2, 4, 8, 16, 32, 64]
+
+def loadWordVectors(wv_file, wv_limit):
+    if isStore(wv_file):
+        return loadStore(wv_file, limit=wv_limit)
+    from gensim.models.keyedvectors import KeyedVectors
+    word_vectors = KeyedVectors.load_word2vec_format(wv_file, binary=False, limit=wv_limit)
+    word_vectors.init_sims()
+    return word_vectors
+
+# (method, words, words length) of the queries in the vocabulary
+def benchmarkQueries(suggester_data, word_vectors):
+    queries = []
+    for words_length, (words, divisions) in sorted(collectQueries(suggester_data).items()):
+        for words_group in [[word] for word in sorted(words)] + [list(division) for division in divisions]:
+            if all(word in word_vectors.vocab for word in words_group):
+                queries.append(('mostSimilar', words_group, words_length))
+                queries.append(('mostSimilarCosmul', words_group, words_length))
+    return queries
+
+# Candidates and latency (in ms) of each query
+def runQueries(index, queries):
+    results, latencies = [], []
+    for method, words, words_length in queries:
+        start = time.time()
+        results.append(getattr(index, method)(words, words_length, TOP_K))
+        latencies.append((time.time() - start) * 1000)
+    return results, numpy.array(latencies)
+
+def recall(exact_results, results):
+    recalls = []
+    for exact_candidates, candidates in zip(exact_results, results):
+        exact_words = set(word for word, _ in exact_candidates)
+        if exact_words:
+            recalls.append(len(exact_words & set(word for word, _ in candidates)) / float(len(exact_words)))
+    return float(numpy.mean(recalls)) if recalls else 1.0
+
+def latencyMeasures(latencies):
+    return { 'meanMs': float(latencies.mean()), 'p50Ms': float(numpy.percentile(latencies, 50)),
+             'p95Ms': float(numpy.percentile(latencies, 95)) }
+
+def methodMeasures(queries, exact_results, results, latencies):
+    measures = {}
+    for method in ('mostSimilar', 'mostSimilarCosmul'):
+        rows = [i for i, (query_method, _, _) in enumerate(queries) if query_method == method]
+        measures[method] = dict(latencyMeasures(latencies[rows]),
+                                recall=recall([exact_results[i] for i in rows], [results[i] for i in rows]))
+    return measures
+
+if __name__ == '__main__':
+    program = os.path.basename(sys.argv[0])
+    logger = logging.getLogger(program)
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
+    logging.root.setLevel(level=logging.INFO)
+    logger.info("running %s" % ' '.join(sys.argv))
+
+    if len(sys.argv) < 4:
+        logger.info("parameters format is wrong - please use:")
+        logger.info("python ann_benchmark.py <wordvec-file> <vectors-limit> <definitions-divisions-file> [<nprobe> ...]")
+        raise SystemExit
+
+    wv_file, wv_limit, divisions_file = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    nprobes = [int(nprobe) for nprobe in sys.argv[4:]] or DEFAULT_NPROBES
+
+    logger.info("loading word vectors file... ")
+    word_vectors = loadWordVectors(wv_file, wv_limit)
+    length_index = createLengthIndex(word_vectors, wv_file, logger)
+    ivf_index = createIVFIndex(length_index, wv_file, nprobes[0], logger)
+
+    with codecs.open(divisions_file, 'r', 'utf-8-sig') as f:
+        queries = benchmarkQueries(json.load(f), word_vectors)
+    logger.info("%d queries" % len(queries))
+
+    exact_results, exact_latencies = runQueries(length_index, queries)
+    benchmark = { 'wordVectors': wv_file, 'vectorsLimit': wv_limit, 'divisions': divisions_file, 'queries': len(queries),
+                  'topK': TOP_K, 'exact': methodMeasures(queries, exact_results, exact_results, exact_latencies), 'ivf': [] }
+    logger.info("exact: mean %.3f ms" % exact_latencies.mean())
+
+    for nprobe in nprobes:
+        ivf_index.nprobe = nprobe
+        results, latencies = runQueries(ivf_index, queries)
+        measures = methodMeasures(queries, exact_results, results, latencies)
+        benchmark['ivf'].append(dict(measures, nprobe=nprobe, speedup=float(exact_latencies.mean() / latencies.mean())))
+        logger.info("nprobe %d: recall@%d cosine %.3f 3CosMul %.3f, mean %.3f ms (%.1fx faster)" %
+                    (nprobe, TOP_K, measures['mostSimilar']['recall'], measures['mostSimilarCosmul']['recall'],
+                     latencies.mean(), exact_latencies.mean() / latencies.mean()))
+
+    benchmark_file = 'ann-benchmark-' + datetime.now().strftime('%Y-%m-%d-%H-%M-%S') + '.json'
+    with codecs.open(benchmark_file, 'w', 'utf-8') as f:
+        json.dump(benchmark, f, indent=2)
+    logger.info("Finished - results were saved into " + benchmark_file)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+ Approximate nearest neighbours index (IVF - inverted file) for the length-bucketed similarity index.
+
+ The exact index scans all the words of the answer's length for each query.
+ Here the normalized vectors of each length bucket are clustered once by spherical k-means,
+  and each word is kept in the (inverted) list of its nearest centroid.
+  The vectors are copied in the order of the lists, so the vectors of a list are scanned as one block.
+ A query scores the centroids of the bucket, and scans only the words of the nprobe lists with the best centroids,
+  so it scores a small part of the bucket, and may miss some of the exact top-k words (see ann_benchmark.py).
+ The candidates of the scanned lists are scored exactly, both for the plain cosine and the 3CosMul queries,
+  and the lists of a 3CosMul query are chosen by the mean of its words.
+ Small buckets are scanned exactly.
+
+ The words of the lists are kept as positions in the arrays of the length index, and can be saved into a word vectors store
+  next to the length index (with the fingerprint of the store, they are built again after the store is written again).
+  With a vectors limit, the positions of words over the limit are skipped.
+"""
+
+import codecs
+import json
+import os.path
+
+import numpy
+
+from vectors_store import unitVector, topIndices, isDerivedFresh, saveDerivedFingerprint
+from similarity_index import fusedQueryVectors, fusedDists
+from batch_similarity import unitRows
+
+IVF_CENTROIDS_FILE = 'ivf-centroids.npy'
+IVF_POSITIONS_FILE = 'ivf-positions.npy'
+IVF_VECTORS_FILE = 'ivf-vectors.npy'
+IVF_OFFSETS_FILE = 'ivf-offsets.npy'
+IVF_BUCKETS_FILE = 'ivf-buckets.json'
+IVF_INDEX_NAME = 'ivf'
+
+# Buckets with less words are scanned exactly
+MIN_IVF_BUCKET_SIZE = 4096
+# Number of lists of a bucket is LISTS_FACTOR * sqrt(bucket size)
+LISTS_FACTOR = 1
+# k-means is trained on a sample of the bucket
+TRAINING_WORDS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+# Maximal number of scores (words * centroids) in one matrix product
+SCORES_CHUNK_SIZE = 2 ** 24
+
+def nearestCentroids(vectors, centroids):
+    chunk_rows = max(1, SCORES_CHUNK_SIZE // len(centroids))
+    return numpy.concatenate([numpy.argmax(vectors[start:start + chunk_rows].dot(centroids.T), axis=1)
+                              for start in range(0, len(vectors), chunk_rows)])
+
+# Spherical k-means - the centroids are unit vectors, and the words are assigned by cosine similarity
+def sphericalKMeans(vectors, lists, random_state):
+    sample_size = min(len(vectors), lists * TRAINING_WORDS_PER_LIST)
+    sample = numpy.asarray(vectors[numpy.sort(random_state.choice(len(vectors), sample_size, replace=False))], dtype=numpy.float32)
+    centroids = sample[random_state.choice(sample_size, lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = nearestCentroids(sample, centroids)
+        order = numpy.argsort(assignment, kind='stable')
+        counts = numpy.bincount(assignment, minlength=lists)
+        filled = numpy.flatnonzero(counts)
+        starts = numpy.concatenate([[0], numpy.cumsum(counts[filled])[:-1]])
+        centroids[filled] = numpy.add.reduceat(sample[order], starts, axis=0)
+        # an empty list gets a random word of the sample
+        empty = numpy.flatnonzero(counts == 0)
+        centroids[empty] = sample[random_state.choice(sample_size, len(empty), replace=False)]
+        centroids = unitRows(centroids)
+    return centroids
+
+class IVFLengthIndex(object):
+    batched = False
+
+    # centroids - of all the lists of all the buckets, lists of a bucket are consecutive,
+    # positions - positions in the length index arrays, grouped by lists, vectors - normalized vectors in the same order,
+    # offsets - start of each list in positions, lists - words length: (first list, end list)
+    def __init__(self, length_index, centroids, positions, vectors, offsets, lists, nprobe):
+        self.length_index = length_index
+        self.word_vectors = length_index.word_vectors
+        self.centroids = centroids
+        self.positions = positions
+        self.vectors = vectors
+        self.offsets = offsets
+        self.lists = lists
+        self.nprobe = nprobe
+
+    def bucket(self, words_length):
+        return self.length_index.bucket(words_length)
+
+    def candidatesOf(self, ids, dists, best, query_indices, topk):
+        return self.length_index.candidatesOf(ids, dists, best, query_indices, topk)
+
+    # Scores of the query vectors (columns) with the words in the best lists for the probe vector,
+    # returns the ids of the words and the scores matrix. Buckets without lists are scanned exactly.
+    def candidatesScores(self, words_length, probe_vector, query_vectors):
+        if words_length not in self.lists:
+            ids, vectors = self.bucket(words_length)
+            return ids, vectors.dot(query_vectors.T)
+
+        first, end = self.lists[words_length]
+        scores = self.centroids[first:end].dot(probe_vector)
+        probed = first + numpy.sort(topIndices(scores, min(self.nprobe, end - first)))
+        probed_lists = list(zip(self.offsets[probed].tolist(), self.offsets[probed + 1].tolist()))
+        positions = numpy.concatenate([self.positions[start:end] for start, end in probed_lists])
+        scores = numpy.concatenate([self.vectors[start:end].dot(query_vectors.T) for start, end in probed_lists])
+        # words over the vectors limit are not in the bucket of the length index
+        _, bucket_end = self.length_index.buckets[words_length]
+        in_limit = positions < bucket_end
+        return self.length_index.ids[positions[in_limit]], scores[in_limit]
+
+    # Approximation of LengthBucketedIndex.mostSimilar
+    def mostSimilar(self, words, words_length, topk):
+        indices = self.length_index.wordIndices(words)
+        mean = unitVector(self.word_vectors.vectors_norm[indices].mean(axis=0))
+        ids, scores = self.candidatesScores(words_length, mean, mean[numpy.newaxis, :])
+        return self.length_index.bestWords(ids, scores[:, 0], indices, topk)
+
+    # Approximation of LengthBucketedIndex.mostSimilarCosmul, the lists are chosen by the mean of the words
+    def mostSimilarCosmul(self, words, words_length, topk):
+        indices = self.length_index.wordIndices(words)
+        mean = unitVector(self.word_vectors.vectors_norm[indices].mean(axis=0))
+        ids, scores = self.candidatesScores(words_length, mean, self.word_vectors.vectors_norm[indices])
+        dists = numpy.prod((1 + scores) / 2, axis=1) / (1 + 0.000001)
+        return self.length_index.bestWords(ids, dists, indices, topk)
+
+    # Approximation of LengthBucketedIndex.mostSimilarAndCosmul, both are scored on the lists of the mean of the words
+    def mostSimilarAndCosmul(self, words, words_length, topk):
+        indices = self.length_index.wordIndices(words)
+        mean = unitVector(self.word_vectors.vectors_norm[indices].mean(axis=0))
+        query_vectors = fusedQueryVectors(self.word_vectors.vectors_norm, indices)
+        ids, scores = self.candidatesScores(words_length, mean, query_vectors)
+        dists, cosmul_dists = fusedDists(scores.T, indices)
+        return (self.length_index.bestWords(ids, dists, indices, topk),
+                self.length_index.bestWords(ids, cosmul_dists, indices, topk))
+
+# Cluster each bucket of the length index (all of its words, also over the vectors limit of a store)
+def buildIVFIndex(length_index, nprobe, seed=0):
+    random_state = numpy.random.RandomState(seed)
+    centroids, positions, offsets, lists = [], [], [0], {}
+    for words_length, (start, end) in sorted(fullBuckets(length_index).items()):
+        size = end - start
+        if size < MIN_IVF_BUCKET_SIZE:
+            continue
+        bucket_vectors = length_index.vectors[start:end]
+        bucket_centroids = sphericalKMeans(bucket_vectors, int(LISTS_FACTOR * numpy.sqrt(size)), random_state)
+        assignment = nearestCentroids(bucket_vectors, bucket_centroids)
+
+        lists[words_length] = (len(offsets) - 1, len(offsets) - 1 + len(bucket_centroids))
+        centroids.append(bucket_centroids)
+        positions.append(start + numpy.argsort(assignment, kind='stable'))
+        offsets.extend(offsets[-1] + numpy.cumsum(numpy.bincount(assignment, minlength=len(bucket_centroids))))
+
+    dimension = length_index.vectors.shape[1]
+    positions = numpy.concatenate(positions) if positions else numpy.zeros(0, dtype=numpy.int64)
+    return IVFLengthIndex(length_index,
+                          numpy.vstack(centroids) if centroids else numpy.zeros((0, dimension), dtype=numpy.float32),
+                          positions, numpy.ascontiguousarray(length_index.vectors[positions]),
+                          numpy.array(offsets, dtype=numpy.int64), lists, nprobe)
+
+# Buckets of the length index without the vectors limit - the words of length l are up to the start of the next length
+def fullBuckets(length_index):
+    starts = sorted((start, words_length) for words_length, (start, _) in length_index.buckets.items())
+    ends = [start for start, _ in starts[1:]] + [len(length_index.ids)]
+    return dict((words_length, (start, end)) for (start, words_length), end in zip(starts, ends))
+
+def hasIVFIndex(store_path):
+    return os.path.isfile(os.path.join(store_path, IVF_BUCKETS_FILE)) and isDerivedFresh(store_path, IVF_INDEX_NAME)
+
+def saveIVFIndex(store_path, ivf_index):
+    numpy.save(os.path.join(store_path, IVF_CENTROIDS_FILE), ivf_index.centroids)
+    numpy.save(os.path.join(store_path, IVF_POSITIONS_FILE), ivf_index.positions)
+    numpy.save(os.path.join(store_path, IVF_VECTORS_FILE), ivf_index.vectors)
+    numpy.save(os.path.join(store_path, IVF_OFFSETS_FILE), ivf_index.offsets)
+    lists = [[words_length, first, end] for words_length, (first, end) in sorted(ivf_index.lists.items())]
+    with codecs.open(os.path.join(store_path, IVF_BUCKETS_FILE), 'w', 'utf-8') as f:
+        json.dump(lists, f)
+    saveDerivedFingerprint(store_path, IVF_INDEX_NAME)
+
+# The positions and the vectors are memory-mapped (as plain arrays, slicing a memmap object is slow),
+# the centroids and the offsets are small, and they are loaded into memory
+def loadIVFIndex(store_path, length_index, nprobe):
+    with codecs.open(os.path.join(store_path, IVF_BUCKETS_FILE), 'r', 'utf-8') as f:
+        lists = dict((words_length, (first, end)) for words_length, first, end in json.load(f))
+    return IVFLengthIndex(length_index,
+                          numpy.load(os.path.join(store_path, IVF_CENTROIDS_FILE)),
+                          numpy.load(os.path.join(store_path, IVF_POSITIONS_FILE), mmap_mode='r').view(numpy.ndarray),
+                          numpy.load(os.path.join(store_path, IVF_VECTORS_FILE), mmap_mode='r').view(numpy.ndarray),
+                          numpy.load(os.path.join(store_path, IVF_OFFSETS_FILE)),
+                          lists, nprobe)
+
+# Use the saved index of a store if exists, otherwise build it (and save it into the store)
+def createIVFIndex(length_index, wv_file, nprobe, logger):
+    if os.path.isdir(wv_file) and hasIVFIndex(wv_file):
+        return loadIVFIndex(wv_file, length_index, nprobe)
+    logger.info("building approximate nearest neighbours index of the word vectors...")
+    ivf_index = buildIVFIndex(length_index, nprobe)
+    if os.path.isdir(wv_file):
+        saveIVFIndex(wv_file, ivf_index)
+        logger.info("approximate nearest neighbours index was saved into " + wv_file)
+    return ivf_index
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+ Batch scoring of the nearest neighbours queries of a divisions file.
+
+ Instead of one matrix-vector product per query, all the queries of the file are collected
+  up front - each word of a multiword division, and each combined division - and grouped by
+  the length of the answer. Each length bucket is scored with a few large matrix-matrix products,
+  in chunks of queries that keep the scores matrix in a bounded size,
+  and the top-k of each row is selected with a partial sort.
+
+ The 3CosMul scores of a combined division are the product of the scores of its words,
+  so they are derived from the same scores matrix of the chunk.
+
+ BatchNeighboursIndex answers the queries in the same way of LengthBucketedIndex,
+  queries that weren't prepared (or contain words which are not in vocabulary) are passed to it.
+ With a NeighboursCache, queries that are found in the cache are not scored again,
+  and the results of the file are added to the cache when they are used.
+ An approximate index (see ann_index.py) scans only a few lists of words for each query,
+  so its queries are not scored in batch, and only the cache is used.
+ A quantized index (see quantized_index.py) scores the buckets by its compact vectors,
+  and the best positions of each query are re-scored by the index in full precision.
+"""
+
+import numpy
+
+from vectors_store import unitVector, topIndicesOfRows
+from similarity_index import wordIndex, MOST_SIMILAR, MOST_SIMILAR_COSMUL
+from neighbours_cache import cacheKey
+from suggester_stats import StageTimer, timedStage
+from suggester_budget import NO_DEADLINE
+import suggester_stats
+
+# Maximal number of scores (queries * bucket words) that are computed in one matrix product
+SCORES_CHUNK_SIZE = 2 ** 25
+# Smaller chunks with a deadline, so the deadline is checked more often
+DEADLINE_SCORES_CHUNK_SIZE = 2 ** 21
+
+# Nearest neighbours queries of a divisions file, grouped by the length of the answer:
+# length: (set of single words, list of unique combined divisions - the order of the words doesn't matter)
+def collectQueries(suggester_data):
+    queries = {}
+    for defintionSuggestedData in suggester_data:
+        if "definition" in defintionSuggestedData and "wordsLength" in defintionSuggestedData["definition"]:
+            if "divisions" in defintionSuggestedData and "multiwordDivisions" in defintionSuggestedData["divisions"]:
+                words_length = defintionSuggestedData["definition"]["wordsLength"]
+                first_word_length = int(words_length[0])
+                words, divisions, sorted_divisions = queries.setdefault(first_word_length, (set(), [], set()))
+                for division in defintionSuggestedData["divisions"]["multiwordDivisions"]:
+                    words.update(division)
+                    # combined similarity is computed only if the solution contains one word
+                    if len(words_length) == 1 and tuple(sorted(division)) not in sorted_divisions:
+                        sorted_divisions.add(tuple(sorted(division)))
+                        divisions.append(tuple(division))
+    return dict((words_length, (words, divisions)) for words_length, (words, divisions, _) in queries.items())
+
+# The words of a division without repetitions, in their order
+def uniqueWords(division):
+    unique_words = []
+    for word in division:
+        if word not in unique_words:
+            unique_words.append(word)
+    return unique_words
+
+class BatchNeighboursIndex(object):
+    def __init__(self, length_index, topk, cache=None):
+        self.length_index = length_index
+        self.topk = topk
+        self.cache = cache
+        self.results = {}
+
+    # Score all the nearest neighbours queries of the divisions file.
+    # The deadline (of the file, see suggester_budget.py) is checked before each chunk, the queries
+    # that were not scored until it passed are left to the definitions.
+    @timedStage('neighboursPrepare')
+    def prepare(self, suggester_data, deadline=NO_DEADLINE):
+        self.results = {}
+        if not self.length_index.batched:
+            return
+        for words_length, (words, divisions) in collectQueries(suggester_data).items():
+            self.scoreBucket(words_length, words, divisions, deadline)
+
+    # A new index with the prepared queries of the divisions file, which shares the cache with this index.
+    # Several files can be served at the same time, each with its own prepared index.
+    def prepared(self, suggester_data, deadline=NO_DEADLINE):
+        file_index = BatchNeighboursIndex(self.length_index, self.topk, self.cache)
+        file_index.prepare(suggester_data, deadline)
+        return file_index
+
+    # Both queries of the words - each query is looked for in the cache, than in the prepared results,
+    # and the queries that both don't have are searched together in one scan
+    def mostSimilarAndCosmul(self, words, words_length, topk):
+        # a word which is not in vocabulary raises KeyError before the queries are counted (it is counted as an OOV word)
+        for word in words:
+            wordIndex(self.length_index.word_vectors, word)
+        keys = [cacheKey(method, words, words_length, topk) for method in (MOST_SIMILAR, MOST_SIMILAR_COSMUL)]
+        suggester_stats.collector.count('queries', len(keys))
+        cached = [self.cache.get(key) if self.cache is not None else None for key in keys]
+        suggester_stats.collector.count('cachedQueries', len(keys) - cached.count(None))
+        candidates = [found if found is not None else self.results.get(key) for key, found in zip(keys, cached)]
+        if candidates.count(None) > 0:
+            suggester_stats.collector.count('searchedQueries', candidates.count(None))
+            with StageTimer('neighboursSearch'):
+                searched = self.length_index.mostSimilarAndCosmul(words, words_length, topk)
+            candidates = [found if found is not None else result for found, result in zip(candidates, searched)]
+        if self.cache is not None:
+            for key, found, result in zip(keys, cached, candidates):
+                if found is None:
+                    self.cache.put(key, result)
+        return candidates[0], candidates[1]
+
+    # Both queries of the words are answered without a search - they are cached or prepared,
+    # or a word is not in vocabulary (so they can't be searched)
+    def isAnswered(self, words, words_length):
+        if not self.isInVocabulary(words):
+            return True
+        keys = [cacheKey(method, words, words_length, self.topk) for method in (MOST_SIMILAR, MOST_SIMILAR_COSMUL)]
+        return all(key in self.results or (self.cache is not None and key in self.cache) for key in keys)
+
+    def isCached(self, words, words_length):
+        return (self.cache is not None and
+                cacheKey(MOST_SIMILAR, words, words_length, self.topk) in self.cache and
+                cacheKey(MOST_SIMILAR_COSMUL, words, words_length, self.topk) in self.cache)
+
+    def isInVocabulary(self, words):
+        return all(word in self.length_index.word_vectors.vocab for word in words)
+
+    # Split the queries into chunks - each chunk contains divisions and the words they are made of,
+    # followed by chunks of the remaining single words
+    def queriesChunks(self, words, divisions, chunk_rows):
+        chunks = []
+        chunk_words, chunk_divisions, chunk_words_set = [], [], set()
+        for division in divisions:
+            new_words = [word for word in uniqueWords(division) if word not in chunk_words_set]
+            if chunk_divisions and len(chunk_words) + len(new_words) + len(chunk_divisions) + 1 > chunk_rows:
+                chunks.append((chunk_words, chunk_divisions))
+                chunk_words, chunk_divisions, chunk_words_set = [], [], set()
+                new_words = uniqueWords(division)
+            chunk_words.extend(new_words)
+            chunk_words_set.update(new_words)
+            chunk_divisions.append(division)
+        if chunk_divisions:
+            chunks.append((chunk_words, chunk_divisions))
+
+        covered_words = set(word for chunk_words, _ in chunks for word in chunk_words)
+        remaining_words = sorted(words - covered_words)
+        for start in range(0, len(remaining_words), chunk_rows):
+            chunks.append((remaining_words[start:start + chunk_rows], []))
+        return chunks
+
+    def scoreBucket(self, words_length, words, divisions, deadline):
+        words = set(word for word in words if word in self.length_index.word_vectors.vocab and
+                    not self.isCached([word], words_length))
+        divisions = [division for division in divisions if self.isInVocabulary(division) and
+                     not self.isCached(division, words_length)]
+        ids, _ = self.length_index.bucket(words_length)
+        chunk_size = DEADLINE_SCORES_CHUNK_SIZE if deadline.active else SCORES_CHUNK_SIZE
+        chunk_rows = max(1, chunk_size // max(1, len(ids)))
+
+        scored_words = set()
+        for chunk_words, chunk_divisions in self.queriesChunks(words, divisions, chunk_rows):
+            if deadline.expired():
+                return
+            self.scoreChunk(words_length, ids, chunk_words, chunk_divisions, scored_words)
+
+    def scoreChunk(self, words_length, ids, chunk_words, chunk_divisions, scored_words):
+        vectors_norm = self.length_index.word_vectors.vectors_norm
+        word_indices = [wordIndex(self.length_index.word_vectors, word) for word in chunk_words]
+        word_rows = dict((word, row) for row, word in enumerate(chunk_words))
+        division_indices = [[word_indices[word_rows[word]] for word in division] for division in chunk_divisions]
+
+        query_vectors = [vectors_norm[index] for index in word_indices]
+        query_vectors += [unitVector(vectors_norm[indices].mean(axis=0)) for indices in division_indices]
+        scores = self.length_index.bucketScores(words_length, numpy.vstack(query_vectors))
+        word_scores = scores[:len(chunk_words)]
+
+        # single word queries
+        new_rows = [row for row, word in enumerate(chunk_words) if word not in scored_words]
+        if new_rows:
+            new_scores = word_scores[new_rows]
+            new_cosmul_scores = ((1 + new_scores) / 2) / (1 + 0.000001)
+            new_queries = [([chunk_words[row]], [word_indices[row]]) for row in new_rows]
+            self.storeResults(MOST_SIMILAR, words_length, ids, new_scores, new_queries)
+            self.storeResults(MOST_SIMILAR_COSMUL, words_length, ids, new_cosmul_scores, new_queries)
+            scored_words.update(chunk_words[row] for row in new_rows)
+
+        # combined division queries
+        if chunk_divisions:
+            division_scores = scores[len(chunk_words):]
+            cosmul_scores = numpy.vstack([numpy.prod([((1 + word_scores[word_rows[word]]) / 2) for word in division], axis=0)
+                                          for division in chunk_divisions]) / (1 + 0.000001)
+            division_queries = list(zip(chunk_divisions, division_indices))
+            self.storeResults(MOST_SIMILAR, words_length, ids, division_scores, division_queries)
+            self.storeResults(MOST_SIMILAR_COSMUL, words_length, ids, cosmul_scores, division_queries)
+
+    # queries - list of (words, indices of the words in the vectors matrix), one for each row of scores
+    def storeResults(self, method, words_length, ids, scores, queries):
+        max_query_words = max(len(set(indices)) for _, indices in queries)
+        best_rows = topIndicesOfRows(scores, self.length_index.shortlistSize(self.topk + max_query_words))
+        for (words, indices), dists, best in zip(queries, scores, best_rows):
+            self.results[cacheKey(method, words, words_length, self.topk)] = self.length_index.shortlistCandidates(
+                method, ids, dists, best, indices, self.topk)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+ Batch similarity scoring of candidates with the words of a clue.
+
+ The suggester scores many candidates (titles, anagrams) against the same words of the clue.
+ n_similarity computes the mean vector of the clue words again for each candidate,
+  and an out of vocabulary word is found by its KeyError.
+ ClueSimilarity computes the (unit) mean vector of the clue words once, looks up the ids of the words
+  of all the candidates together, and scores all the candidates that are in the vocabulary by one matrix product.
+ The scores are the same as n_similarity (the cosine similarity between the mean vectors of the raw vectors),
+  and candidates that n_similarity can't score get nan.
+"""
+
+import numpy
+
+from similarity_index import wordIndex
+
+# id of a word which is not in the vocabulary
+MISSING = -1
+
+def wordsIds(word_vectors, words):
+    vocab = word_vectors.vocab
+    return numpy.array([wordIndex(word_vectors, word) if word in vocab else MISSING for word in words], dtype=numpy.int64)
+
+# The raw (not normalized) vectors, as used by n_similarity
+def rawVectorsOfIds(word_vectors, ids):
+    if hasattr(word_vectors, 'norms'):
+        # a word vectors store keeps the normalized vectors and their norms, see vectors_store.py
+        return word_vectors.vectors_norm[ids] * word_vectors.norms[ids][:, numpy.newaxis]
+    return word_vectors.vectors[ids]
+
+# unitVector of each row
+def unitRows(vectors):
+    norms = numpy.sqrt(numpy.einsum('ij,ij->i', vectors, vectors))
+    positive = norms > 0
+    vectors[positive] /= norms[positive][:, numpy.newaxis]
+    return vectors
+
+# Unit mean vectors of groups of words, given the ids of all the groups one after another and their (positive) lengths
+def groupsCentroids(word_vectors, ids, lengths):
+    starts = numpy.concatenate([[0], numpy.cumsum(lengths)[:-1]])
+    sums = numpy.add.reduceat(rawVectorsOfIds(word_vectors, ids), starts, axis=0)
+    return unitRows(sums / lengths[:, numpy.newaxis].astype(sums.dtype))
+
+class ClueSimilarity(object):
+    def __init__(self, word_vectors, clue_words):
+        self.word_vectors = word_vectors
+        ids = wordsIds(word_vectors, clue_words)
+        known_ids = ids[ids != MISSING]
+
+        # all the clue words are needed for n_similarity
+        self.centroid = None
+        if len(clue_words) > 0 and len(known_ids) == len(clue_words):
+            self.centroid = groupsCentroids(word_vectors, known_ids, numpy.array([len(known_ids)]))[0]
+        # partial similarity uses the clue words that are in the vocabulary, if they are the majority of the words
+        self.partial_centroid = None
+        if len(known_ids) * 2 > len(clue_words):
+            self.partial_centroid = groupsCentroids(word_vectors, known_ids, numpy.array([len(known_ids)]))[0]
+
+    # Ids of all the words of the groups, and the number of words of each group
+    def groupsIds(self, groups):
+        lengths = numpy.array([len(group) for group in groups], dtype=numpy.int64)
+        ids = wordsIds(self.word_vectors, [word for group in groups for word in group])
+        return ids, lengths
+
+    def scoreGroups(self, centroid, ids, lengths, scored):
+        scores = numpy.full(len(lengths), numpy.nan, dtype=numpy.float32)
+        if centroid is not None and scored.any():
+            words_of_scored = numpy.repeat(scored, lengths)
+            centroids = groupsCentroids(self.word_vectors, ids[words_of_scored], lengths[scored])
+            scores[scored] = centroids.dot(centroid)
+        return scores
+
+    # n_similarity of the clue words with each group of words, nan if a word (of the clue or the group) is out of vocabulary
+    def similarities(self, groups):
+        ids, lengths = self.groupsIds(groups)
+        words_group = numpy.repeat(numpy.arange(len(groups)), lengths)
+        missing_words = numpy.bincount(words_group[ids == MISSING], minlength=len(groups))
+        return self.scoreGroups(self.centroid, ids, lengths, (missing_words == 0) & (lengths > 0))
+
+    # partialSimScore of each group - the similarity between the words of the group and the words of the clue
+    # that are in the vocabulary, nan if the group has no such words or most of the clue words are out of vocabulary
+    def partialSimilarities(self, groups):
+        ids, lengths = self.groupsIds(groups)
+        known = ids != MISSING
+        words_group = numpy.repeat(numpy.arange(len(groups)), lengths)
+        known_lengths = numpy.bincount(words_group[known], minlength=len(groups))
+        return self.scoreGroups(self.partial_centroid, ids[known], known_lengths, known_lengths > 0)
@@ -12,16 +12,16 @@ CRCR-CS (CRyptic CRossword clues Candidates Suggester)
   but finding the correct division is part of the puzzle.
   
  Input:
-     1. Pre-trained word vectors file in text format (not binary)
+     1. Pre-trained word vectors file in text format (not binary), or a word vectors store (see vectors_store.py)
      2. Format of word embedding - ft = fasttext, w2v = word2vec
-     2. Dictionaries that are based on titles (articles names) in wikipedia, in json format.
+     2. Dictionaries that are based on titles (articles names) in wikipedia, in json format, or compiled (see titles_index.py).
      4. Clues (definitions) division data - a file that was created by the JS app in json format:
          definition info - such as the length of the words in the solution.
          A list of possible divisions of the words in the definition.
  Output:
      A file containing candidates for the answer (solution) of each clue, in json format.
 
- The script was checked for both py2.7 (terminal) and py3.6 (IPython console).
+ The script requires python 3.6 or later (it was checked in a terminal and in the IPython console).
  In some terminals Hebrew charcters may be unreadable.
     
  First, the script loads the word vectors (this could take a long time) 
@@ -39,6 +39,22 @@ CRCR-CS (CRyptic CRossword clues Candidates Suggester)
 from datetime import datetime
 
 from gensim.models.keyedvectors import KeyedVectors
+from vectors_store import isStore, loadStore, META_FILE as STORE_META_FILE
+from similarity_index import createLengthIndex
+from ann_index import createIVFIndex
+from quantized_index import createQuantizedIndex, QUANTIZATIONS
+from batch_index import BatchNeighboursIndex
+from neighbours_cache import NeighboursCache
+from results_cache import ResultsCache, fileFingerprint
+from directory_watch import DirectoryWatch, WATCH_INTERVAL
+from definitions_pool import isForkSupported, mapInProcesses
+from titles_index import LookupIndex, isTitlesIndex, loadTitlesIndex, META_FILE as TITLES_META_FILE
+from candidates_stream import iterateJsonArray, batchesOf, streamHeader, resumeRecords, exportJsonArray
+from batch_similarity import ClueSimilarity
+from suggester_stats import StageTimer, timedStage, candidatesCount
+from suggester_budget import Budget, NO_DEADLINE, COMPLETE, TRUNCATED
+import suggester_stats
+from anagram_index import createSubAnagramIndex, clueWords, groupBySortedLetters, createVocabularySignatures
 
 import logging
 import json
@@ -46,12 +62,13 @@ import os.path
 import codecs
 from six.moves import input
 import sys
+import time
 import numpy
 
 
 # similarities parameters
-# Empirically, 100 gives reasonable results
-TOP_N = 100  
+# Number of candidates (of the answer's length) in each nearest neighbours query
+TOP_K = 10
 # Deafult score of similarity for title OOV words   
 DEFAULT_SIM = 1
 
@@ -83,89 +100,73 @@ def sort(candidates):
      and there are other cases, which won't be discussed here.
 
 """
-def isNumberOfCandidatesInsufficient(candidatesNumber):
-    return not candidatesNumber or len(candidatesNumber) < 10
-
-# filter candidates that don't fit to the length of the words in the answer
-def optimizeWords(most_sim_words, words_length):
-    optimize_most_sim_words = []
-    for sim_word in most_sim_words:
-        if len(sim_word[0]) == words_length:
-            optimize_most_sim_words.append(sim_word)
-    return optimize_most_sim_words
-
-# Most similar and nearest neighours queries.
-# word_vectors.most_similar returns the values in descending order
-def calcTop10MostSimilarWords(word_vectors, words, search_word_length):
-    # equivalnce to: word_vectors.similar_by_word(word, topn=TOP_N)
-    most_sim_words = word_vectors.most_similar(positive=words,topn=TOP_N)
-    optimize_words = optimizeWords(most_sim_words, search_word_length)
-    
-    # If insufficient number of candidates was found, re-calc similiar words in a larger space
-    if isNumberOfCandidatesInsufficient(optimize_words):
-        most_sim_words = word_vectors.most_similar(positive=words,topn=TOP_N*4)
-        optimize_words = optimizeWords(most_sim_words, search_word_length)
-    
-    return optimize_words
-    
-# Compute top-n most similar queries with 3Cosmul (Levy and Goldberg, Linguistic Regularities in Sparse and Explicit Word Representations, 2014)
-# word_vectors.most_similar_cosmul returns the values in descending order
-def calcTop10MostSimilarCosmulWords(word_vectors, words, search_word_length):
-    most_sim_words = word_vectors.most_similar_cosmul(positive=words,topn=TOP_N)
-    optimize_words = optimizeWords(most_sim_words, search_word_length)
-    
-    # If insufficient number of candidates was found, re-calc similiar words in a larger space
-    if isNumberOfCandidatesInsufficient(optimize_words):
-        most_sim_words = word_vectors.most_similar_cosmul(positive=words,topn=TOP_N*4)
-        optimize_words = optimizeWords(most_sim_words, search_word_length)
-    
-    return optimize_words
+# Most similar and nearest neighours queries, searched only among words that fit to the length of the words in the answer.
+# Both top-n queries of the words - equivalnce to: word_vectors.most_similar(positive=words), and the same query with 3Cosmul
+# (Levy and Goldberg, Linguistic Regularities in Sparse and Explicit Word Representations, 2014), filtered by the length of the words,
+# from one computation of the similarities with the words of the given length. similarity_index returns the values in descending order
+def calcTop10MostSimilarAndCosmulWords(similarity_index, words, search_word_length):
+    return similarity_index.mostSimilarAndCosmul(words, search_word_length, TOP_K)
 
 # Find to 10 similar neighbors for each word. 
 # The results of this function are no longer used in the ranking algorithm (JS app), 
 # since empirically it doesn't provide good results. 
-def calcSingleWordMeasures(word_vectors, words, search_words_length, logger):
+def calcSingleWordMeasures(similarity_index, words, search_words_length, logger):
     singleWordMeasures = []
     for word in words:
+        suggester_stats.collector.count('multiwordWords')
         try:
-            optimized_most_sim_words = calcTop10MostSimilarWords(word_vectors, [word], search_words_length)
-            optimized_most_sim_cosmul_words = calcTop10MostSimilarCosmulWords(word_vectors, [word], search_words_length)
+            optimized_most_sim_words, optimized_most_sim_cosmul_words = calcTop10MostSimilarAndCosmulWords(similarity_index, [word], search_words_length)
             singleWordMeasures.append({ 'word': word, 'mostSimWords': optimized_most_sim_words, 'mostSimCosmulWords': optimized_most_sim_cosmul_words})
         except KeyError:
+            suggester_stats.collector.count('multiwordOOVWords')
             logger.warning("\"word " + word + " not in vocabulary\"")
     return singleWordMeasures
 
 # Create candidates based on multiword expression divisions
-def getMultiwordMeasures(divisions, words_length, wv_format, titles_data, word_vectors, logger):
-    divisionsMeasures = []
+@timedStage('multiwordMeasures')
+def getMultiwordMeasures(divisions, words_length, wv_format, titles_data, word_vectors, similarity_index, logger):
+    divisionsMeasures = newMultiwordMeasures(divisions, wv_format)
+    calcMultiwordEmbeddingsMeasures(divisionsMeasures, divisions, words_length, similarity_index, logger)
+    calcMultiwordTitlesMeasures(divisionsMeasures, divisions, words_length, titles_data, word_vectors, logger)
+    return divisionsMeasures
+
+# measures of similiraties for each word in each division, they are filled by the techniques
+def newMultiwordMeasures(divisions, wv_format):
+    return [{ 'singleWordMeasures': [], 'mostSimWords': [], 'mostSimCosmulWords': [], 'wordEmbeddingTechnique': wv_format }
+            for _ in divisions]
+
+""" First solving techinque using word embeddings """
+def calcMultiwordEmbeddingsMeasures(divisionsMeasures, divisions, words_length, similarity_index, logger, deadline=NO_DEADLINE):
     # currently, multword expression only yield candidates if solution contains one word
     first_word_length = int(words_length[0])
-    for division in divisions:
-        # measures of similiraties for each word in the division:
-        divisionMeasures = { 'singleWordMeasures': [], 'mostSimWords': [],
-                            'mostSimCosmulWords': [], 'wordEmbeddingTechnique': wv_format }
-        try:                        
-            """ First solving techinque using word embeddings """
+    for division, divisionMeasures in zip(divisions, divisionsMeasures):
+        # after the deadline, a division whose queries were already scored (see batch_index.py) is still filled by lookups
+        if deadline.active and not isDivisionAnswered(similarity_index, division, words_length) and deadline.expired():
+            continue
+        try:
             # for each word, calc similar neighbors
-            divisionMeasures['singleWordMeasures'] = calcSingleWordMeasures(word_vectors, division, first_word_length, logger)
+            divisionMeasures['singleWordMeasures'] = calcSingleWordMeasures(similarity_index, division, first_word_length, logger)
 
             if len(words_length) == 1:
                 # combined similarity measures - similarity between division parts
-                divisionMeasures['mostSimWords'] = calcTop10MostSimilarWords(word_vectors, division, first_word_length)
-                divisionMeasures['mostSimCosmulWords'] = calcTop10MostSimilarCosmulWords(word_vectors, division, first_word_length)
+                divisionMeasures['mostSimWords'], divisionMeasures['mostSimCosmulWords'] = calcTop10MostSimilarAndCosmulWords(similarity_index, division, first_word_length)
         except KeyError as e:
             logger.warning(e)
 
-        """ Second solving technique using both titles dict and word vectors """
-        # lookupDict is based on multiword expressions
-        if "lookupDict" in titles_data:
-            if len(words_length) == 1:
-                divisionMeasures['titlesMeasures'] = calcTitlesMeasures(titles_data["lookupDict"], word_vectors, division, first_word_length, logger)
-        
-        """ Collect the measures into the candidates collection """
-        divisionsMeasures.append(divisionMeasures)
-    
-    return divisionsMeasures
+# All the nearest neighbours queries of the division are answered without a search
+def isDivisionAnswered(similarity_index, division, words_length):
+    first_word_length = int(words_length[0])
+    queries = [[word] for word in division] + ([division] if len(words_length) == 1 else [])
+    return all(similarity_index.isAnswered(words, first_word_length) for words in queries)
+
+""" Second solving technique using both titles dict and word vectors """
+def calcMultiwordTitlesMeasures(divisionsMeasures, divisions, words_length, titles_data, word_vectors, logger, deadline=NO_DEADLINE):
+    # lookupDict is based on multiword expressions
+    if "lookupDict" in titles_data and len(words_length) == 1:
+        for division, divisionMeasures in zip(divisions, divisionsMeasures):
+            if deadline.expired():
+                break
+            divisionMeasures['titlesMeasures'] = calcTitlesMeasures(titles_data["lookupDict"], word_vectors, division, int(words_length[0]), logger)
     
 """ 
  Similarities services - multiword expressions - titles technique
@@ -173,7 +174,12 @@ def getMultiwordMeasures(divisions, words_length, wv_format, titles_data, word_v
   and word vectors to score the created candidates.
 """
 # Find shared words between title names (= multiword expressions) in the dictionary    
+@timedStage('titlesLookup')
 def findSharedWordsBetweenTitlesDicts(titles_dict, words):
+    # compiled dictionary intersects sorted posting lists of word ids
+    if isinstance(titles_dict, LookupIndex):
+        return titles_dict.sharedWords(words)
+
     sharedMweDict = []
     if len(words) > 1:
         if words[0] in titles_dict and words[1] in titles_dict:
@@ -187,23 +193,26 @@ def findSharedWordsBetweenTitlesDicts(titles_dict, words):
     
 # Search for candidates based on titles dictionary
 # Currently it searches only for words that share MWE with all of the words in the clue
+@timedStage('titlesMeasures')
 def calcTitlesMeasures(titles_dict, word_vectors, words, search_words_length, logger):
     sharedMweDict = findSharedWordsBetweenTitlesDicts(titles_dict, words)
     
     # Score/scale the shared words in the dictionary using similiraty measures
     titlesMostSimWords = []
     titlesSharedWordsWithoutSim = []
-    for shardMweWord in sharedMweDict:
-        if len(shardMweWord) == search_words_length:
-            try:
-                cossim = word_vectors.n_similarity(words, [shardMweWord])
-                # convertion of cossim to string is needed in order for the json.dump to work in python 2.7
-                titlesMostSimWords.append((shardMweWord, cossim))
-                
-            # In some cases candidates words could be found in the shared titles dictionary, 
-            # but simularity between them and words of the division can't be computed due to OOV words.
-            except KeyError:
-                titlesSharedWordsWithoutSim.append((shardMweWord, DEFAULT_SIM))
+    sharedMweWords = [shardMweWord for shardMweWord in sharedMweDict if len(shardMweWord) == search_words_length]
+    # all the shared words are scored together, see batch_similarity.py
+    similarities = ClueSimilarity(word_vectors, words).similarities([[shardMweWord] for shardMweWord in sharedMweWords])
+    suggester_stats.collector.count('titlesCandidates', len(sharedMweWords))
+    suggester_stats.collector.count('titlesCandidatesOOV', int(numpy.isnan(similarities).sum()))
+    for shardMweWord, cossim in zip(sharedMweWords, similarities):
+        if not numpy.isnan(cossim):
+            titlesMostSimWords.append((shardMweWord, cossim))
+            
+        # In some cases candidates words could be found in the shared titles dictionary, 
+        # but simularity between them and words of the division can't be computed due to OOV words.
+        else:
+            titlesSharedWordsWithoutSim.append((shardMweWord, DEFAULT_SIM))
 
     titlesMeasures = { 'titlesMostSimWords': sort(titlesMostSimWords), 'titlesWithoutSim': sort(titlesSharedWordsWithoutSim) }
     return titlesMeasures
@@ -219,21 +228,20 @@ def calcTitlesMeasures(titles_dict, word_vectors, words, search_words_length, lo
  Sometimes such defintions contains hints words that imply that an anagram is used in the solution:
     such as "confused", "strange", "messy", etc. There are other cases, which won't be discussed here.
 """
-# Score the similarity between two sets of words in the clue - the anagram segemnt and the non-anagram segement.
-def calcSimliraityBetweenWords(word_vectors, anagram_words, second_part_words, logger):
-    if len(anagram_words) > 0 and len(second_part_words) > 0:
-        # Ignore words which are not in the dicionary
-        for word in anagram_words:
-            if word not in word_vectors.vocab:
-                raise KeyError
-    
-        cossim = word_vectors.n_similarity(second_part_words, anagram_words)
-        if len(anagram_words) == 1:
-            return (anagram_words[0], cossim)
-        
-        # Join the anagram words to one string separated with space
-        unifiedCandidateWords = ' '.join(anagram_words)
-        return (unifiedCandidateWords, cossim)
+# Score the similarity between two sets of words in the clue - each group of anagram words and the non-anagram segement.
+# All the groups are scored together, see batch_similarity.py
+def calcSimliraityBetweenWords(word_vectors, anagram_words_groups, second_part_words, logger):
+    similarityMeasures = []
+    if len(anagram_words_groups) > 0 and len(second_part_words) > 0:
+        similarities = ClueSimilarity(word_vectors, second_part_words).similarities(anagram_words_groups)
+        suggester_stats.collector.count('anagramGroups', len(anagram_words_groups))
+        suggester_stats.collector.count('anagramGroupsOOV', int(numpy.isnan(similarities).sum()))
+        for anagram_words, cossim in zip(anagram_words_groups, similarities):
+            # Ignore anagrams with words which are not in the dicionary
+            if not numpy.isnan(cossim):
+                # Join the anagram words to one string separated with space
+                similarityMeasures.append((' '.join(anagram_words), cossim))
+    return similarityMeasures
 
 # The title string in the dictionary can be a shuffle of the words in the definition -
 # e.g: "room blue" is a shuffle of "blue room", and in such case it should be filtered 
@@ -251,29 +259,12 @@ def isCandidateBasedOnDefintion(candidate_words, anagram_part_words, logger):
             return True
     return False
 
-# Score "partial similarity" bewteen most of the words in the title name,
+# Score "partial similarity" bewteen the words in the title names that are in the vocabulary,
 # and most of the words in the non-anagram segement of the clue.
-def partialSimScore(word_vectors, title_words_string, non_anagram_part_words, logger):
-    title_words_in_vocub = []
-    non_anagram_in_vocub = []
-
-    title_words = title_words_string.split()
-    
-    for word in title_words:
-        if word in word_vectors.vocab:
-            title_words_in_vocub.append(word)
-            
-    if len(title_words_in_vocub) > 0:
-        for word in non_anagram_part_words:
-            if word in word_vectors.vocab:
-                non_anagram_in_vocub.append(word)
-
-    if len(non_anagram_in_vocub) * 2 > len(non_anagram_part_words):
-        cossim = word_vectors.n_similarity(non_anagram_in_vocub, title_words_in_vocub)
-        return cossim
-    
+def partialSimScores(clue_similarity, titles_words, logger):
+    similarities = clue_similarity.partialSimilarities(titles_words)
     # partial similarity score was not found, use default score of 1
-    return DEFAULT_SIM            
+    return [DEFAULT_SIM if numpy.isnan(cossim) else cossim for cossim in similarities]
 
 # Get a list of words composing the non-anagram part of the clue.
 def getListOfWordsComposingClue(non_anagram_part_words, anagram_part_words):
@@ -284,6 +275,7 @@ def getListOfWordsComposingClue(non_anagram_part_words, anagram_part_words):
     return anagram_part_words
 
 # Score the similarity of title name from the dictianry with the non-anagram segement of the clue.
+@timedStage('titlesAnagramMeasures')
 def calcTitlesAnagramSimilarities(titles_dict, word_vectors, sortedAnagramLetters, non_anagram_part_words, anagram_part_words, words_length, logger):
     titlesMostSimWords = []
     titlesAnagramsWithoutSim = []
@@ -294,165 +286,404 @@ def calcTitlesAnagramSimilarities(titles_dict, word_vectors, sortedAnagramLetter
         if sortedAnagramLetters in titles_dict:
             anagramOfTitles = titles_dict[sortedAnagramLetters]
             if len(anagramOfTitles) > 0:
+                titles = []
                 for title_words_string in anagramOfTitles:
                     title_words = title_words_string.split()
                     if not isCandidateBasedOnDefintion(title_words, anagram_part_words, logger):
-                        wordsComposingSimilaritySide = getListOfWordsComposingClue(non_anagram_part_words, anagram_part_words)
-                            
-                        try: 
-                            anagram_words_length = [len (word) for word in title_words_string.split()]
-                            if anagram_words_length == words_length:
-                                cossim = word_vectors.n_similarity(wordsComposingSimilaritySide, title_words)
-                                titlesMostSimWords.append((title_words_string, cossim))
-                        except KeyError:
-                            # Try to calculate partial similarity
-                                simScore = partialSimScore(word_vectors, title_words_string, wordsComposingSimilaritySide, logger)
-                                titlesAnagramsWithoutSim.append((title_words_string, simScore))
+                        anagram_words_length = [len (word) for word in title_words]
+                        if anagram_words_length == words_length:
+                            titles.append((title_words_string, title_words))
+
+                # all the titles are scored together, see batch_similarity.py
+                wordsComposingSimilaritySide = getListOfWordsComposingClue(non_anagram_part_words, anagram_part_words)
+                clueSimilarity = ClueSimilarity(word_vectors, wordsComposingSimilaritySide)
+                similarities = clueSimilarity.similarities([title_words for _, title_words in titles])
+                titlesWithOOV = [title for title, cossim in zip(titles, similarities) if numpy.isnan(cossim)]
+                suggester_stats.collector.count('titlesAnagrams', len(titles))
+                suggester_stats.collector.count('titlesAnagramsOOV', len(titlesWithOOV))
+                for (title_words_string, _), cossim in zip(titles, similarities):
+                    if not numpy.isnan(cossim):
+                        titlesMostSimWords.append((title_words_string, cossim))
+
+                # Try to calculate partial similarity
+                simScores = partialSimScores(clueSimilarity, [title_words for _, title_words in titlesWithOOV], logger)
+                for (title_words_string, _), simScore in zip(titlesWithOOV, simScores):
+                    titlesAnagramsWithoutSim.append((title_words_string, simScore))
 
     titlesMeasures = { 'titlesMostSimWords': sort(titlesMostSimWords), 'titlesWithoutSim': titlesAnagramsWithoutSim }
     return titlesMeasures  
 
+# The anagrams of the JS app are permutations of the letters of the division (sortedAnagramLetters),
+# so the anagrams of a one word solution that are in the vocabulary are the vocabulary words with these letters
+def vocabularyAnagramsWordsGroups(anagramsWordsGroups, sortedAnagramLetters, vocabularySignatures):
+    vocabularyWords = set(vocabularySignatures.words(sortedAnagramLetters))
+    if len(vocabularyWords) == 0:
+        return []
+    return [anagramWordsGroup for anagramWordsGroup in anagramsWordsGroups
+            if len(anagramWordsGroup) == 1 and anagramWordsGroup[0] in vocabularyWords]
+
+# The anagrams from the vocabulary of the clue's letters, by their sorted letters
+def getVocabularyAnagrams(definition, divisions, titles_data):
+    if "subAnagramIndex" not in titles_data:
+        return {}
+    subAnagrams = titles_data["subAnagramIndex"].subAnagrams(clueWords(divisions["anagramDivisions"]), definition["wordsLength"])
+    return groupBySortedLetters(subAnagrams)
+
 # Create candidates based on anagrams divisions
-def getAnagramMeasures(definition, divisions, titles_data, word_vectors, logger):
+@timedStage('anagramMeasures')
+def getAnagramMeasures(definition, divisions, titles_data, word_vectors, logger, deadline=NO_DEADLINE):
+    solutionWordsLength = [int(num) for num in definition["wordsLength"]]
     divisionsMeasures = []
     for division in divisions["anagramDivisions"]:
         divisionMeasures = { 'clueWords': [], 'mostSimMeasures': [], 'titlesMeasures': [] }
-        
-        if "firstPart" in division:
-            if "secondPart" in division:
-                # join the anagram separated parts and copy into the candidate, for convenience only
-                divisionMeasures['clueWords'] = ' '.join(division['secondPart'])
-                
-            if "anagrams" in division:
-                similarityMeasures = []
-                
-                for anagramWordsGroup in division["anagrams"]:
-                    
-                    # In some cases, the anagram is composed from all the words in the definition. This case will be ignore for now.
-                    if len(anagramWordsGroup) > 0 and len(division["firstPart"]) > 0:
-                        try:
-                            if not isCandidateBasedOnDefintion(anagramWordsGroup, division['secondPart'], logger):
-                                similarityMeasure = calcSimliraityBetweenWords(word_vectors, anagramWordsGroup, division["firstPart"], logger)
-                                similarityMeasures.append(similarityMeasure) 
-    
-                        # The majority of the anagrams should throw OOV error.
-                        except KeyError:
-                            pass
-                        
-                divisionMeasures['mostSimMeasures'] = sort(divisionMeasures['mostSimMeasures'] + similarityMeasures)
-            
-            if "sortedAnagramLetters" in division and "secondPart" in division and "anagramDict" in titles_data:
-                solutionWordsLength = [int(num) for num in definition["wordsLength"]]
-                titlesSimilarityMeasure = calcTitlesAnagramSimilarities(titles_data["anagramDict"], word_vectors, 
-                                                                        division['sortedAnagramLetters'],
-                                                                        division["firstPart"], 
-                                                                        division["secondPart"], 
-                                                                        solutionWordsLength,  logger)
-                divisionMeasures['titlesMeasures'] = titlesSimilarityMeasure
-                
-        # A case in which the entire definition is an anagram and also a non-anagram clue
-        else:
-            if "secondPart" in division:
-                # join the anagram separated parts and copy into the candidate, for convenience only
-                divisionMeasures['clueWords'] = ' '.join(division['secondPart'])
-            if "sortedAnagramLetters" in division and "secondPart" in division and "anagramDict" in titles_data:
-                titlesSimilarityMeasure = calcTitlesAnagramSimilarities(titles_data["anagramDict"], word_vectors, 
-                                                                        division['sortedAnagramLetters'],
-                                                                        [], 
-                                                                        division["secondPart"], 
-                                                                        solutionWordsLength,  logger)
+        if "secondPart" in division:
+            # join the anagram separated parts and copy into the candidate, for convenience only
+            divisionMeasures['clueWords'] = ' '.join(division['secondPart'])
         divisionsMeasures.append(divisionMeasures)
+
+    # The titles of an anagram are found by one lookup of its letters, so they are searched before the anagrams of the vocabulary.
+    # A division without firstPart is a case in which the entire definition is an anagram and also a non-anagram clue,
+    # it has no candidates.
+    for division, divisionMeasures in zip(divisions["anagramDivisions"], divisionsMeasures):
+        if deadline.expired():
+            break
+        if "firstPart" in division and "sortedAnagramLetters" in division and "secondPart" in division and "anagramDict" in titles_data:
+            divisionMeasures['titlesMeasures'] = calcTitlesAnagramSimilarities(titles_data["anagramDict"], word_vectors,
+                                                                               division['sortedAnagramLetters'],
+                                                                               division["firstPart"],
+                                                                               division["secondPart"],
+                                                                               solutionWordsLength,  logger)
+
+    # The JS app creates the anagrams of short solutions only (all the permutations of the letters).
+    # For the other divisions, the anagrams from the vocabulary are found by one query of the clue's letters in the sub-anagrams index.
+    vocabularyAnagrams = None
+    for division, divisionMeasures in zip(divisions["anagramDivisions"], divisionsMeasures):
+        if "firstPart" not in division:
+            continue
+        if deadline.expired():
+            break
+
+        anagramsWordsGroups = division.get("anagrams")
+        if (anagramsWordsGroups is not None and "vocabularySignatures" in titles_data and
+                "sortedAnagramLetters" in division and len(definition["wordsLength"]) == 1):
+            # reject the anagrams that are not in the vocabulary without scoring them, they are counted as out of vocabulary
+            vocabularyWordsGroups = vocabularyAnagramsWordsGroups(anagramsWordsGroups, division["sortedAnagramLetters"], titles_data["vocabularySignatures"])
+            suggester_stats.collector.count('anagramGroups', len(anagramsWordsGroups) - len(vocabularyWordsGroups))
+            suggester_stats.collector.count('anagramGroupsOOV', len(anagramsWordsGroups) - len(vocabularyWordsGroups))
+            anagramsWordsGroups = vocabularyWordsGroups
+        if anagramsWordsGroups is None and "sortedAnagramLetters" in division:
+            if vocabularyAnagrams is None:
+                vocabularyAnagrams = getVocabularyAnagrams(definition, divisions, titles_data)
+            anagramsWordsGroups = [[word] for word in vocabularyAnagrams.get(division["sortedAnagramLetters"], [])]
+
+        if anagramsWordsGroups is not None:
+            # In some cases, the anagram is composed from all the words in the definition. This case will be ignore for now.
+            anagramWordsGroupsToScore = [anagramWordsGroup for anagramWordsGroup in anagramsWordsGroups
+                                         if len(anagramWordsGroup) > 0 and len(division["firstPart"]) > 0
+                                         and not isCandidateBasedOnDefintion(anagramWordsGroup, division['secondPart'], logger)]
+            # The majority of the anagrams are not in the vocabulary, and they are ignored.
+            similarityMeasures = calcSimliraityBetweenWords(word_vectors, anagramWordsGroupsToScore, division["firstPart"], logger)
+                    
+            divisionMeasures['mostSimMeasures'] = sort(divisionMeasures['mostSimMeasures'] + similarityMeasures)
     return divisionsMeasures  
     
-""" CANDIDATAES' SUGGESTER """
-def main():
-    
-    """ logger """
-    logger = logging.getLogger(os.path.basename(sys.argv[0]))
-    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
-    logging.root.setLevel(level=logging.INFO)
-    logger.info("running %s" % ' '.join(sys.argv))
-
-    if len(sys.argv) != 6:
-        logger.info("parameters format is wrong:")
-        logger.info("python candidates-suggester.py <wordvec-format> <wordvec-file> <vectors-limit> <titles-files> <definitions-divisions-files>")
-        logger.info("possible wordvec formats are ft and w2v")
-        logger.info("make sure that all parameters are given, and that file path does not contain Hebrew chars, otherwise problems could occurs.")
+""" Command line parameters """
+# Optional parameters are given after the positional parameters as: --name value
+# name: default value
+OPTIONS = {
+    # maximal number of nearest neighbours queries kept in the cache, 0 disables the cache
+    'cache-size': '100000',
+    # file for keeping the cache between runs
+    'cache-file': None,
+    # port of local HTTP service, instead of divisions files (see suggester_server.py)
+    'serve': None,
+    'host': '127.0.0.1',
+    # number of divisions data that are searched at the same time by the service
+    'server-threads': '4',
+    # number of processes that search candidates for the definitions of a divisions file
+    'workers': '1',
+    # exact - scan all the words of the answer's length, ivf - approximate nearest neighbours, see ann_index.py
+    'neighbours': 'exact',
+    # number of lists that are scanned by each approximate query, more lists - better recall and slower queries
+    'nprobe': '32',
+    # float16 / int8 - scan compact vectors and re-score the best candidates in full precision, see quantized_index.py
+    'quantization': 'none',
+    # on - collect timers and counters of the stages, see suggester_stats.py
+    'stats': 'off',
+    # json - one candidates file, jsonl - stream each candidates record into a line, see candidates_stream.py
+    'output-format': 'json',
+    # number of definitions that are read and searched together in the jsonl format
+    'stream-batch': '1000',
+    # directory of the candidates of definitions that were already searched, see results_cache.py
+    'results-cache': None,
+    # directory of divisions files, which are searched when they are added or changed, instead of divisions files from the input
+    'watch': None,
+    # anytime mode - time budget of each definition (milliseconds) and of each divisions file (seconds), see suggester_budget.py
+    'definition-budget': None,
+    'file-budget': None,
+}
+
+# Split the parameters into a list of positional parameters and a dictionary of options.
+# Returns None if an unknown option, or an option without value was given.
+def parseArguments(args):
+    arguments = []
+    options = dict(OPTIONS)
+    i = 0
+    while i < len(args):
+        if args[i].startswith('--'):
+            name = args[i][2:]
+            if name not in OPTIONS or i + 1 == len(args):
+                return None, None
+            options[name] = args[i + 1]
+            i += 2
+        else:
+            arguments.append(args[i])
+            i += 1
+    return arguments, options
+
+def isPositiveNumber(text):
+    try:
+        return float(text) > 0
+    except ValueError:
+        return False
+
+def logUsage(logger):
+    logger.info("parameters format is wrong:")
+    logger.info("python candidates-suggester.py <wordvec-format> <wordvec-file> <vectors-limit> <titles-files> <definitions-divisions-files> [options]")
+    logger.info("or as a local HTTP service: python candidates-suggester.py <wordvec-format> <wordvec-file> <vectors-limit> <titles-files> --serve <port> [options]")
+    logger.info("or watching a directory: python candidates-suggester.py <wordvec-format> <wordvec-file> <vectors-limit> <titles-files> --watch <divisions-dir> [options]")
+    logger.info("possible wordvec formats are ft and w2v")
+    logger.info("options: --cache-size <queries> --cache-file <path> --workers <processes> --output-format <json|jsonl> --stream-batch <definitions> --results-cache <dir> --definition-budget <milliseconds> --file-budget <seconds> --neighbours <exact|ivf> --nprobe <lists> --quantization <none|float16|int8> --stats <on|off> --host <address> --server-threads <threads>")
+    logger.info("make sure that all parameters are given, and that file path does not contain Hebrew chars, otherwise problems could occurs.")
 
-        raise SystemExit
-    
-    wv_format, wv_file, wv_limit, titles_file, divisions_file  = sys.argv[1:6]
+""" CANDIDATAES' SUGGESTER """
+# Only definitions with the words length of the solution have candidates
+def hasWordsLength(defintionSuggestedData):
+    return "definition" in defintionSuggestedData and "wordsLength" in defintionSuggestedData["definition"]
+
+# Create the candidates of one definition, returns None if the definition has no words length
+@timedStage('definitions', definition=True)
+def suggestDefinitionCandidates(defintionSuggestedData, wv_format, titles_data, word_vectors, similarity_index, logger, deadline=NO_DEADLINE):
+    logger.info(defintionSuggestedData['definition']['verbalClue'])
+    if hasWordsLength(defintionSuggestedData):
         
-    """ load word vectors """
+        divisionsMeasures = { 'multiwordDivisionsMeasures': [], 
+                             'regularDivisionsMeasures': [], 'anagramDivisionsMeasures': [] }
+    
+        if "divisions" in defintionSuggestedData and deadline.active:
+            calcMeasuresInBudget(divisionsMeasures, defintionSuggestedData, wv_format, titles_data, word_vectors, similarity_index, logger, deadline)
+        elif "divisions" in defintionSuggestedData:
+            # Divsions contains several types that are based on differnet classes of clues
+
+            # Iterate and explore divisions related to multiword expression of each definition
+            if "multiwordDivisions" in defintionSuggestedData["divisions"]:
+                divisionsMeasures['multiwordDivisionsMeasures'] = getMultiwordMeasures(defintionSuggestedData["divisions"]["multiwordDivisions"], 
+                                 defintionSuggestedData["definition"]["wordsLength"], wv_format, titles_data, word_vectors, similarity_index, logger)
+            
+            # Iterate and explore divisions related to anagrams of words in the definition
+            if "anagramDivisions" in defintionSuggestedData["divisions"]:
+                divisionsMeasures['anagramDivisionsMeasures'] = getAnagramMeasures(defintionSuggestedData["definition"], defintionSuggestedData["divisions"], titles_data, word_vectors, logger)
+
+        if suggester_stats.collector.enabled:
+            suggester_stats.collector.count('candidates', candidatesCount(divisionsMeasures))
+        candidateData = {'divisionsMeasures': divisionsMeasures, 'definition': defintionSuggestedData['definition']}
+        if deadline.active:
+            candidateData['status'] = TRUNCATED if deadline.truncated else COMPLETE
+            suggester_stats.collector.count('budgetDefinitions')
+            if deadline.truncated:
+                suggester_stats.collector.count('truncatedDefinitions')
+                logger.warning("the time budget has passed, the candidates of \"%s\" are truncated" % defintionSuggestedData['definition']['verbalClue'])
+        return candidateData
+    return None
+
+# Anytime mode - the techniques run from the cheapest to the most expensive, until the deadline of the definition:
+# the titles lookups of the multiword divisions, the anagrams (titles first), and the nearest neighbours of the multiword divisions
+def calcMeasuresInBudget(divisionsMeasures, defintionSuggestedData, wv_format, titles_data, word_vectors, similarity_index, logger, deadline):
+    divisions = defintionSuggestedData["divisions"]
+    words_length = defintionSuggestedData["definition"]["wordsLength"]
+    if "multiwordDivisions" in divisions:
+        divisionsMeasures['multiwordDivisionsMeasures'] = newMultiwordMeasures(divisions["multiwordDivisions"], wv_format)
+        with StageTimer('multiwordMeasures'):
+            calcMultiwordTitlesMeasures(divisionsMeasures['multiwordDivisionsMeasures'], divisions["multiwordDivisions"],
+                                        words_length, titles_data, word_vectors, logger, deadline)
+
+    if "anagramDivisions" in divisions:
+        divisionsMeasures['anagramDivisionsMeasures'] = getAnagramMeasures(defintionSuggestedData["definition"], divisions, titles_data, word_vectors, logger, deadline)
+
+    if "multiwordDivisions" in divisions:
+        with StageTimer('multiwordMeasures'):
+            calcMultiwordEmbeddingsMeasures(divisionsMeasures['multiwordDivisionsMeasures'], divisions["multiwordDivisions"],
+                                            words_length, similarity_index, logger, deadline)
+
+"""                
+For each division in the input, the CRCR-CS is searching for words in Hebrew
+ that have the strongest semantic relationship with each part of the division.
+"""
+def suggestCandidates(suggester_data, wv_format, titles_data, word_vectors, similarity_index, logger, workers=1, results_cache=None, file_budget=None):
+    return list(generateCandidates(suggester_data, wv_format, titles_data, word_vectors, similarity_index, logger, workers, results_cache, file_budget))
+
+# The candidates of the definitions, each one is generated when it is ready.
+# file_budget - the time budget of the divisions file in the anytime mode, see suggester_budget.py
+def generateCandidates(suggester_data, wv_format, titles_data, word_vectors, similarity_index, logger, workers=1, results_cache=None, file_budget=None):
+    if results_cache is not None:
+        return generateCachedCandidates(suggester_data, wv_format, titles_data, word_vectors, similarity_index, logger, workers, results_cache, file_budget)
+
+    # the nearest neighbours queries of all the definitions are scored together, see batch_index.py.
+    # In the anytime mode, the scoring stops when the budget of the file has passed.
+    file_index = similarity_index.prepared(suggester_data, file_budget.deadline if file_budget is not None else NO_DEADLINE)
+
+    def suggestDefinition(defintionSuggestedData):
+        deadline = file_budget.definitionDeadline() if file_budget is not None else NO_DEADLINE
+        return suggestDefinitionCandidates(defintionSuggestedData, wv_format, titles_data, word_vectors, file_index, logger, deadline)
+
+    # Iterate on each definition and prepare candidates
+    if workers > 1 and len(suggester_data) > 1:
+        candidatesData = suggestInWorkers(suggestDefinition, suggester_data, file_index, workers)
+    else:
+        candidatesData = (suggestDefinition(defintionSuggestedData) for defintionSuggestedData in suggester_data)
+    return (candidateData for candidateData in candidatesData if candidateData is not None)
+
+# The candidates of the definitions, only the definitions that aren't in the results cache are searched (together), see results_cache.py
+# Truncated candidates are not kept in the cache, and the candidates from the cache are complete.
+def generateCachedCandidates(suggester_data, wv_format, titles_data, word_vectors, similarity_index, logger, workers, results_cache, file_budget):
+    definitions = [defintionSuggestedData for defintionSuggestedData in suggester_data if hasWordsLength(defintionSuggestedData)]
+    keys = [results_cache.key(defintionSuggestedData) for defintionSuggestedData in definitions]
+    cachedData = [results_cache.get(key) for key in keys]
+    missing_definitions = [defintionSuggestedData for defintionSuggestedData, candidateData in zip(definitions, cachedData) if candidateData is None]
+    searchedData = generateCandidates(missing_definitions, wv_format, titles_data, word_vectors, similarity_index, logger, workers, file_budget=file_budget)
+
+    for key, candidateData in zip(keys, cachedData):
+        if candidateData is None:
+            candidateData = next(searchedData)
+            if candidateData.get('status') != TRUNCATED:
+                results_cache.put(key, dict((name, value) for name, value in candidateData.items() if name != 'status'))
+        elif file_budget is not None:
+            candidateData['status'] = COMPLETE
+        yield candidateData
+
+# Search the candidates of the definitions in forked processes, see definitions_pool.py
+def suggestInWorkers(suggestDefinition, suggester_data, file_index, workers):
+    cache = file_index.cache
+
+    # each worker uses its own copy of the cache and the stats, so it returns its cache hits and misses, and its stats
+    def suggestDefinitionInWorker(defintionSuggestedData):
+        hits, misses = cache.hits, cache.misses
+        if suggester_stats.collector.enabled:
+            suggester_stats.collector.reset()
+        candidateData = suggestDefinition(defintionSuggestedData)
+        stats = suggester_stats.collector.state() if suggester_stats.collector.enabled else None
+        return candidateData, cache.hits - hits, cache.misses - misses, stats
+
+    results = mapInProcesses(suggestDefinitionInWorker, suggester_data, workers)
+    for _, hits, misses, stats in results:
+        cache.hits += hits
+        cache.misses += misses
+        if stats is not None:
+            suggester_stats.collector.merge(stats)
+    # add the queries of the file to the cache of this process
+    for key, candidates in file_index.results.items():
+        cache.put(key, candidates)
+    return [candidateData for candidateData, _, _, _ in results]
+
+def loadWordVectors(wv_format, wv_file, wv_limit, logger):
     logger.info("loading word vectors file... ")
 
     # ft = fasttext, w2v = gensim word2vec
     if wv_format == "ft" or wv_format == 'w2v':
-        # example_path ../fasttext/cc.he.300.vec 
-        word_vectors = KeyedVectors.load_word2vec_format(wv_file, binary=False, limit=int(wv_limit))
+        # A store directory created by vectors_store.py is memory-mapped, which takes seconds
+        if isStore(wv_file):
+            word_vectors = loadStore(wv_file, limit=int(wv_limit))
+        else:
+            # example_path ../fasttext/cc.he.300.vec 
+            word_vectors = KeyedVectors.load_word2vec_format(wv_file, binary=False, limit=int(wv_limit))
 
     else:
         logger.info("Word vectors format it invalid, choose 'ft' for pretrained fastext or 'w2v' for traind word2vec")
         raise SystemExit
     
     logger.info("word vectors file was loaded")
-    
-    """ load titles dict json file """
+    return word_vectors
+
+def loadTitles(titles_file, logger):
     logger.info("loading titles dict file... ")
-    with codecs.open(titles_file ,'r', 'utf-8-sig') as f:
-        titles_data = json.load(f)
+    # A titles index directory created by titles_index.py is memory-mapped
+    if isTitlesIndex(titles_file):
+        titles_data = loadTitlesIndex(titles_file)
+    else:
+        with codecs.open(titles_file ,'r', 'utf-8-sig') as f:
+            titles_data = json.load(f)
         
     logger.info("titles dict file was loaded")
+    return titles_data
+
+def logCacheStats(neighbours_cache, logger):
+    logger.info("neighbours cache: %d hits, %d misses, %d cached queries" % (neighbours_cache.hits, neighbours_cache.misses, len(neighbours_cache)))
+
+# The budget of a divisions file (or a request of the service) in the anytime mode, or None without budgets
+def startFileBudget(options):
+    if options['definition-budget'] is None and options['file-budget'] is None:
+        return None
+    definition_seconds = float(options['definition-budget']) / 1000 if options['definition-budget'] is not None else None
+    file_seconds = float(options['file-budget']) if options['file-budget'] is not None else None
+    return Budget(definition_seconds, file_seconds).startFile()
+
+def logResultsCacheStats(results_cache, logger):
+    if results_cache is not None:
+        logger.info("results cache: %d definitions were reused, %d were searched" % (results_cache.hits, results_cache.misses))
+        results_cache.resetStats()
+
+def workersNumber(options, logger):
+    workers = int(options['workers'])
+    if workers > 1 and not isForkSupported():
+        logger.warning("worker processes are not supported on this platform, using one process")
+        workers = 1
+    return workers
+
+# Search the candidates of a divisions file, and write them into a candidates file
+def suggestForFile(divisions_file, wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, workers, options, logger):
+    if options['output-format'] == 'jsonl':
+        candidatesData = None
+        streamCandidates(divisions_file, wv_format, titles_data, word_vectors, similarity_index, workers, options, logger, results_cache)
+    else:
+        logger.info("loading suggester data file with divisions...")
+        with StageTimer('divisionsLoad'), codecs.open(divisions_file ,'r', 'utf-8-sig') as f:
+            suggester_data = json.load(f)
+        logger.info("suggester data file was loaded")
     
-    """ load divisions data """
-    waiting_for_divisions_file = True
-    while waiting_for_divisions_file == True:
-        try:
-            logger.info("loading suggester data file with divisions...")
-            with codecs.open(divisions_file ,'r', 'utf-8-sig') as f:
-                suggester_data = json.load(f)
-            logger.info("suggester data file was loaded")
-        
-            logger.info("searching for candidates... may take some time")
-            
-            """                
-            For each division in the input, the CRCR-CS is searching for words in Hebrew
-             that have the strongest semantic relationship with each part of the division.
-            """
-            
-            # Iterate on each definition and prepare candidates
-            candidatesData = []
-            for defintionSuggestedData in suggester_data:
-                logger.info(defintionSuggestedData['definition']['verbalClue'])
-                if "definition" in defintionSuggestedData and "wordsLength" in defintionSuggestedData["definition"]:
-                    
-                    divisionsMeasures = { 'multiwordDivisionsMeasures': [], 
-                                         'regularDivisionsMeasures': [], 'anagramDivisionsMeasures': [] }
-                
-                    if "divisions" in defintionSuggestedData:
-                        # Divsions contains several types that are based on differnet classes of clues
-
-                        # Iterate and explore divisions related to multiword expression of each definition
-                        if "multiwordDivisions" in defintionSuggestedData["divisions"]:
-                            divisionsMeasures['multiwordDivisionsMeasures'] = getMultiwordMeasures(defintionSuggestedData["divisions"]["multiwordDivisions"], 
-                                             defintionSuggestedData["definition"]["wordsLength"], wv_format, titles_data, word_vectors, logger)
-                        
-                        # Iterate and explore divisions related to anagrams of words in the definition
-                        if "anagramDivisions" in defintionSuggestedData["divisions"]:
-                            divisionsMeasures['anagramDivisionsMeasures'] = getAnagramMeasures(defintionSuggestedData["definition"], defintionSuggestedData["divisions"], titles_data, word_vectors, logger)
-                            
-                    candidateData = {'divisionsMeasures': divisionsMeasures, 'definition': defintionSuggestedData['definition']}
-                    candidatesData.append(candidateData)
-          
-            """ Write candidates output """
-            logger.info('writing candidates file...')
-            currTime = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-            candidates_data_file = 'candidates-' + currTime + '.json'
-            
+        logger.info("searching for candidates... may take some time")
+        candidatesData = suggestCandidates(suggester_data, wv_format, titles_data, word_vectors, similarity_index, logger, workers, results_cache, startFileBudget(options))
+
+    logCacheStats(neighbours_cache, logger)
+    neighbours_cache.resetStats()
+    if options['cache-file']:
+        neighbours_cache.save(options['cache-file'])
+    logResultsCacheStats(results_cache, logger)
+  
+    """ Write candidates output """
+    logger.info('writing candidates file...')
+    # several divisions files can be searched in the same second (in the watch mode)
+    outputName = os.path.splitext(os.path.basename(divisions_file))[0] + '-' + datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+    candidates_data_file = 'candidates-' + outputName + '.json'
+    
+    with StageTimer('outputWrite'):
+        if candidatesData is None:
+            exportJsonArray(streamFileName(divisions_file), candidates_data_file)
+        else:
             with codecs.open(candidates_data_file ,'w+', 'utf-8') as f:
                 json.dump(candidatesData, f, ensure_ascii=False, cls=NumpyEncoder)
-            logger.info('finished with current suggested data divsions')
+    logger.info('finished with current suggested data divsions - candidates of %s were saved into %s' % (divisions_file, candidates_data_file))
+
+    if suggester_stats.collector.enabled:
+        writeStats(divisions_file, 'stats-' + outputName + '.json', logger)
+
+# Search candidates for divisions files, until stop / quit / exit is entered
+def suggestForFiles(divisions_file, wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, options, logger):
+    workers = workersNumber(options, logger)
 
+    waiting_for_divisions_file = True
+    while waiting_for_divisions_file == True:
+        try:
+            suggestForFile(divisions_file, wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, workers, options, logger)
         except IOError as e:
             logger.error(e)
 
@@ -464,5 +695,158 @@ def main():
         else:
             divisions_file = next_command
 
+# Search candidates for each divisions file that is added to the directory or changed, until the process is stopped (CTRL+C)
+def watchDirectory(watch_dir, wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, options, logger):
+    workers = workersNumber(options, logger)
+    watch = DirectoryWatch(watch_dir)
+    logger.info("watching %s for divisions files, stop using CTRL+C" % watch_dir)
+    try:
+        while True:
+            for divisions_file in watch.poll():
+                logger.info("searching candidates for " + divisions_file)
+                # a changed file is searched again from its start (see candidates_stream.py),
+                # its unchanged definitions are read from the results cache
+                try:
+                    suggestForFile(divisions_file, wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, workers, options, logger)
+                except Exception:
+                    # a file that fails (e.g. not a valid divisions file) doesn't stop the watch, it is searched again when it is changed
+                    logger.exception("failed to search candidates for " + divisions_file)
+            time.sleep(WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        logger.info("stopped watching " + watch_dir)
+
+# Summary of the timers and counters of a divisions file, the stats are collected again for the next file
+def writeStats(divisions_file, stats_file, logger):
+    summary = suggester_stats.collector.summary()
+    summary['divisionsFile'] = divisions_file
+    with codecs.open(stats_file, 'w+', 'utf-8') as f:
+        json.dump(summary, f, indent=2)
+    definitions = summary['definitions']
+    logger.info("%d definitions, latency p50 %.1f ms, p90 %.1f ms, p99 %.1f ms - stats were saved into %s" %
+                (definitions['count'], definitions['p50Ms'], definitions['p90Ms'], definitions['p99Ms'], stats_file))
+    suggester_stats.collector.reset()
+
+# The json lines file of a divisions file, a run on the same divisions file resumes it (if the divisions file wasn't changed)
+def streamFileName(divisions_file):
+    return 'candidates-' + os.path.splitext(os.path.basename(divisions_file))[0] + '.jsonl'
+
+# Read the definitions one at a time, and write each candidates record into a line of the json lines file when it is ready
+def streamCandidates(divisions_file, wv_format, titles_data, word_vectors, similarity_index, workers, options, logger, results_cache=None):
+    stream_file = streamFileName(divisions_file)
+    done_records = resumeRecords(stream_file, streamHeader(divisions_file))
+    if done_records > 0:
+        logger.info("resuming %s after %d candidates records" % (stream_file, done_records))
+
+    logger.info("searching for candidates... may take some time")
+    file_budget = startFileBudget(options)
+    with codecs.open(divisions_file ,'r', 'utf-8-sig') as f, codecs.open(stream_file, 'a', 'utf-8') as out:
+        definitions = iterateJsonArray(f)
+
+        # skip the definitions that already have a record in the file
+        def remainingDefinitions():
+            skipped_records = 0
+            for defintionSuggestedData in definitions:
+                if skipped_records < done_records:
+                    skipped_records += hasWordsLength(defintionSuggestedData)
+                else:
+                    yield defintionSuggestedData
+
+        for batch in batchesOf(remainingDefinitions(), int(options['stream-batch'])):
+            for candidateData in generateCandidates(batch, wv_format, titles_data, word_vectors, similarity_index, logger, workers, results_cache, file_budget):
+                out.write(json.dumps(candidateData, ensure_ascii=False, cls=NumpyEncoder) + '\n')
+                out.flush()
+
+# Serve candidates over local HTTP until the process is stopped (CTRL+C)
+def serveCandidates(wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, options, logger):
+    def suggest(suggester_data):
+        candidatesData = suggestCandidates(suggester_data, wv_format, titles_data, word_vectors, similarity_index, logger,
+                                           results_cache=results_cache, file_budget=startFileBudget(options))
+        logCacheStats(neighbours_cache, logger)
+        return candidatesData
+
+    # the service is imported only when it is used
+    from suggester_server import SuggesterServer
+
+    # the stats of the service are collected since it started, and they are exposed in GET /metrics
+    metrics = suggester_stats.collector.metricsText if suggester_stats.collector.enabled else None
+    server = SuggesterServer(suggest, int(options['server-threads']), NumpyEncoder, logger, metrics)
+    server.serveForever(options['host'], int(options['serve']))
+    if options['cache-file']:
+        neighbours_cache.save(options['cache-file'])
+
+def main():
+    
+    """ logger """
+    logger = logging.getLogger(os.path.basename(sys.argv[0]))
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
+    logging.root.setLevel(level=logging.INFO)
+    logger.info("running %s" % ' '.join(sys.argv))
+
+    arguments, options = parseArguments(sys.argv[1:])
+    # the service and the watch mode receive the divisions over HTTP or from a directory instead of a divisions file
+    arguments_number = 4 if options and (options['serve'] or options['watch']) else 5
+    if (arguments is None or len(arguments) != arguments_number or (options['serve'] and options['watch']) or options['neighbours'] not in ('exact', 'ivf') or
+            options['stats'] not in ('on', 'off') or options['quantization'] not in ('none',) + QUANTIZATIONS or
+            (options['neighbours'] == 'ivf' and options['quantization'] != 'none') or
+            not all(isPositiveNumber(options[name]) for name in ('definition-budget', 'file-budget') if options[name] is not None)):
+        logUsage(logger)
+        raise SystemExit
+    
+    wv_format, wv_file, wv_limit, titles_file = arguments[:4]
+    # the quantized vectors save memory only when the full vectors stay memory-mapped on disk,
+    # with a text file they would be kept in memory in addition to the full vectors
+    if options['quantization'] != 'none' and not isStore(wv_file):
+        logger.info("--quantization requires a word vectors store, convert the vectors file using: python vectors_store.py %s <store-dir>" % wv_file)
+        raise SystemExit
+    if options['stats'] == 'on':
+        suggester_stats.enable()
+        
+    """ load word vectors """
+    word_vectors = loadWordVectors(wv_format, wv_file, wv_limit, logger)
+
+    # nearest neighbours queries search only the words of the answer's length
+    length_index = createLengthIndex(word_vectors, wv_file, logger)
+    if options['quantization'] != 'none':
+        length_index = createQuantizedIndex(length_index, wv_file, options['quantization'], logger)
+    if options['neighbours'] == 'ivf':
+        length_index = createIVFIndex(length_index, wv_file, int(options['nprobe']), logger)
+
+    # cache of nearest neighbours queries, shared by all the divisions files
+    # approximate and quantized queries are cached apart from exact queries
+    fingerprint = os.path.abspath(wv_file) + ':' + wv_limit
+    if options['neighbours'] == 'ivf':
+        fingerprint += ':ivf:' + options['nprobe']
+    if options['quantization'] != 'none':
+        fingerprint += ':' + options['quantization']
+    neighbours_cache = NeighboursCache(int(options['cache-size']), fingerprint=fingerprint)
+    if options['cache-file']:
+        logger.info("loaded %d cached queries" % neighbours_cache.load(options['cache-file']))
+
+    # the queries of each divisions file are scored together, see batch_index.py
+    similarity_index = BatchNeighboursIndex(length_index, TOP_K, neighbours_cache)
+    
+    """ load titles dict json file """
+    titles_data = loadTitles(titles_file, logger)
+
+    # candidates of definitions that were already searched with the same vectors and titles
+    results_cache = None
+    if options['results-cache']:
+        results_fingerprint = '%s:%s:%d:%s' % (fingerprint, fileFingerprint(wv_file, STORE_META_FILE), TOP_K,
+                                               fileFingerprint(titles_file, TITLES_META_FILE))
+        results_cache = ResultsCache(options['results-cache'], results_fingerprint, NumpyEncoder)
+
+    # letters histograms of the vocabulary, for the anagrams of the clues, see anagram_index.py
+    titles_data["subAnagramIndex"] = createSubAnagramIndex(word_vectors, wv_file, logger)
+    # vocabulary words by their sorted letters, for the anagrams of the JS app
+    titles_data["vocabularySignatures"] = createVocabularySignatures(word_vectors, wv_file, logger)
+    
+    """ load divisions data """
+    if options['serve']:
+        serveCandidates(wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, options, logger)
+    elif options['watch']:
+        watchDirectory(options['watch'], wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, options, logger)
+    else:
+        suggestForFiles(arguments[4], wv_format, titles_data, word_vectors, similarity_index, neighbours_cache, results_cache, options, logger)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
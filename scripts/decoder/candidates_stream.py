@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+ Streaming of large divisions files into candidates files.
+
+ The divisions file (a json array of definitions) is parsed one definition at a time,
+  and the candidates are written as json lines (one candidates record per line) when they are ready,
+  so the memory doesn't grow with the size of the file, and a crash loses no finished work.
+ The first line is a header which identifies the divisions file (its absolute path, size and modification time).
+ A run on a partially written candidates file of the same divisions file resumes it: an incomplete last line is removed,
+  and the definitions of the complete lines are skipped. A file of another divisions file, or of an older version
+  of the divisions file, is started again.
+ When all the definitions are done, the json lines (without the header) are copied into a json array,
+  which is the same as the candidates file of a regular run.
+"""
+
+import codecs
+import json
+import os
+import os.path
+
+# Number of characters that are read from the divisions file at once
+READ_SIZE = 2 ** 20
+
+WHITESPACE = ' \t\r\n'
+
+# Items of a json array in a file, one at a time
+def iterateJsonArray(f, read_size=READ_SIZE):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    end_of_file = False
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+
+        # need more characters - for the next token, or for an item that was cut in the middle
+        if position == len(buffer):
+            if end_of_file:
+                raise ValueError("unexpected end of json array")
+            buffer, position, end_of_file = readMore(f, buffer, position, read_size)
+            continue
+
+        char = buffer[position]
+        if not started:
+            if char != '[':
+                raise ValueError("the file doesn't contain a json array")
+            started = True
+            position += 1
+        elif char == ']':
+            return
+        elif char == ',':
+            position += 1
+        else:
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if end_of_file:
+                    raise
+                buffer, position, end_of_file = readMore(f, buffer, position, read_size)
+                continue
+            yield item
+
+def readMore(f, buffer, position, read_size):
+    data = f.read(read_size)
+    return buffer[position:] + data, 0, len(data) == 0
+
+# Lists of up to size items of the iterable
+def batchesOf(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# The header of the json lines file of a divisions file
+def streamHeader(divisions_file):
+    stat = os.stat(divisions_file)
+    return { 'divisionsFile': os.path.abspath(divisions_file), 'size': stat.st_size, 'mtime': stat.st_mtime_ns }
+
+# Number of complete records in a json lines file of the given header. An incomplete last line (of a crashed run) is removed.
+# A new file, or a file with another header, is started again with the header.
+def resumeRecords(path, header):
+    header_line = (json.dumps(header, ensure_ascii=False, sort_keys=True) + '\n').encode('utf-8')
+    records = 0
+    complete_size = len(header_line)
+    with open(path, 'ab+') as f:
+        f.seek(0)
+        if f.readline() == header_line:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                records += 1
+                complete_size += len(line)
+            f.truncate(complete_size)
+        else:
+            f.truncate(0)
+            f.write(header_line)
+    return records
+
+# Copy the records of a json lines file into a json array file, one line at a time
+def exportJsonArray(jsonl_path, json_path):
+    with codecs.open(jsonl_path, 'r', 'utf-8') as source, codecs.open(json_path, 'w+', 'utf-8') as target:
+        # the header line
+        source.readline()
+        target.write('[')
+        for i, line in enumerate(source):
+            if i > 0:
+                target.write(', ')
+            target.write(line.rstrip('\n'))
+        target.write(']')
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+ Parallel processing of the definitions of a divisions file in a pool of processes.
+
+ The workers are forked from the suggester process after everything was loaded and prepared,
+  so they share the word vectors (memory-mapped or in memory), the titles dictionaries
+  and the prepared nearest neighbours queries read-only, without copying or pickling them.
+ Only the positions of the definitions are sent to the workers, and only the candidates are sent back.
+ The definitions are split into consecutive chunks, and the results are collected by the order of the chunks,
+  so the output is identical to a serial run.
+"""
+
+import gc
+import multiprocessing
+
+# Number of chunks of definitions per worker, smaller chunks balance the load between the workers
+CHUNKS_PER_WORKER = 4
+
+# The function and the definitions of the current map, inherited by the forked workers
+worker_function = None
+worker_items = None
+
+def isForkSupported():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+def runChunk(chunk):
+    start, end = chunk
+    return [worker_function(item) for item in worker_items[start:end]]
+
+# Returns [function(item) for item in items], computed by the given number of processes
+def mapInProcesses(function, items, workers):
+    global worker_function, worker_items
+    worker_function, worker_items = function, items
+    chunk_size = max(1, -(-len(items) // (workers * CHUNKS_PER_WORKER)))
+    chunks = [(start, min(start + chunk_size, len(items))) for start in range(0, len(items), chunk_size)]
+
+    # Objects that were created before the fork are moved out of the garbage collector generations,
+    # so the collector in the workers won't write into their memory pages, which stay shared (python 3.7 or later)
+    freeze = hasattr(gc, 'freeze')
+    if freeze:
+        gc.freeze()
+    try:
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        try:
+            results = pool.map(runChunk, chunks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        if freeze:
+            gc.unfreeze()
+        worker_function, worker_items = None, None
+    return [result for chunk_results in results for result in chunk_results]
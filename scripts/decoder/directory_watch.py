@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+ Polling watch of a directory of divisions files.
+
+ Each poll lists the json files of the directory, and returns the files which are new or were changed
+  since they were returned last time. A file is returned only after its size and modification time
+  didn't change between two polls, so a file which is still being copied into the directory is not read.
+ The candidates and stats files of the suggester are ignored, so the suggester can write them into the watched directory.
+"""
+
+import os
+import os.path
+
+# Seconds between polls
+WATCH_INTERVAL = 2.0
+IGNORED_PREFIXES = ('candidates-', 'stats-')
+
+class DirectoryWatch(object):
+    def __init__(self, path):
+        self.path = path
+        # file: (size, modification time) of the previous poll, and of the time it was returned
+        self.polled = {}
+        self.returned = {}
+
+    def files(self):
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                      if name.endswith('.json') and not name.startswith(IGNORED_PREFIXES))
+
+    # The new or changed files that were not changed since the previous poll
+    def poll(self):
+        polled, ready = {}, []
+        for path in self.files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # removed since it was listed
+                continue
+            polled[path] = (stat.st_size, stat.st_mtime)
+            if self.polled.get(path) == polled[path] and self.returned.get(path) != polled[path]:
+                self.returned[path] = polled[path]
+                ready.append(path)
+        self.polled = polled
+        return ready
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+ Bounded LRU cache of nearest neighbours queries.
+
+ The same words are queried over and over - in overlapping divisions of the same clue,
+  and in the next divisions files which are served by the same process.
+ The cache keeps the candidates of each query by (method, words, length of the answer, k).
+  The words of a query are sorted, since the combined vector of the words doesn't depend on their order.
+ When the cache is full, the least recently used query is evicted.
+ The cache can be saved into a file, so it is kept between restarts of the suggester.
+ The cache can be used by several threads.
+"""
+
+import codecs
+import collections
+import json
+import os
+import os.path
+import threading
+
+CACHE_FILE_VERSION = 1
+
+def cacheKey(method, words, words_length, topk):
+    return (method, tuple(sorted(words)), words_length, topk)
+
+class NeighboursCache(object):
+    def __init__(self, max_size, fingerprint=''):
+        self.max_size = max_size
+        # identifies the word vectors the results were computed with
+        self.fingerprint = fingerprint
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Membership test, doesn't count as a lookup
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # mark as the most recently used
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.entries.pop(key)
+            self.entries[key] = value
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, path):
+        with self.lock:
+            entries = [[method, list(words), words_length, topk, candidates]
+                       for (method, words, words_length, topk), candidates in self.entries.items()]
+        data = { 'version': CACHE_FILE_VERSION, 'fingerprint': self.fingerprint, 'entries': entries }
+        # write to a temporary file first, so an interrupted save won't break the cache file
+        temp_path = path + '.tmp'
+        with codecs.open(temp_path, 'w', 'utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    # Load saved entries, unless they were computed with other word vectors. Returns number of loaded entries.
+    def load(self, path):
+        if not os.path.isfile(path):
+            return 0
+        with codecs.open(path, 'r', 'utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != CACHE_FILE_VERSION or data.get('fingerprint') != self.fingerprint:
+            return 0
+        for method, words, words_length, topk, candidates in data['entries']:
+            self.put((method, tuple(words), words_length, topk), [tuple(candidate) for candidate in candidates])
+        return len(self.entries)
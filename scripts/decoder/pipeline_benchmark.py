@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ End to end benchmark of the candidates suggester, on synthetic fixtures.
+
+ For each scale, the fixtures are generated offline (once, into <work-dir>/<scale>):
+     store - a word vectors store of random Hebrew words (see vectors_store.py), the vectors are noisy copies
+      of topic vectors, so the nearest neighbours have some structure.
+     titles.json - a titles dictionary with lookupDict and anagramDict, made of random titles of vocabulary words.
+     divisions.json - definitions in the structure of the JS app output: the clue words are the multiword division,
+      the anagram divisions are the word groups with the length of the solution, with all the anagrams of
+      solutions of up to 7 letters.
+ The stages of the suggester are timed separately, using the functions of the suggester:
+     vectorsLoad, titlesLoad, subAnagramIndex, multiwordMeasures (with the batch scoring of the file),
+     anagramMeasures, outputWrite.
+ The results are logged, and saved into pipeline-benchmark-<time>.json in the work directory,
+  so results of several versions can be compared.
+
+     python pipeline_benchmark.py <work-dir> [<scale> ...]
+"""
+
+import codecs
+import importlib
+import itertools
+import json
+import logging
+import os.path
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy
+
+from vectors_store import saveStore, loadStore
+from similarity_index import buildLengthIndex, saveLengthIndex, createLengthIndex
+from batch_index import BatchNeighboursIndex
+from anagram_index import REGULAR_LETTERS, FINAL_LETTERS, createSubAnagramIndex, lettersCounts, sortedLetters
+
+# words - vocabulary size, titles - number of titles in the dictionaries, definitions - number of clues
+SCALES = {
+    'small': { 'words': 20000, 'dimension': 100, 'titles': 20000, 'definitions': 100 },
+    'medium': { 'words': 100000, 'dimension': 300, 'titles': 200000, 'definitions': 500 },
+    'large': { 'words': 500000, 'dimension': 300, 'titles': 1000000, 'definitions': 2000 },
+}
+DEFAULT_SCALES = ['small', 'medium']
+
+TOPICS = 2000
+WORDS_LENGTHS = [2, 3, 3, 4, 4, 4, 5, 5, 5, 6, 6, 7, 8]
+# clue words are from the frequent words, as the solutions of the clues
+FREQUENT_WORDS = 20000
+OOV_RATE = 0.1
+# the JS app creates the anagrams of solutions of up to 7 letters
+MAX_LENGTH_FOR_ANAGRAMS = 7
+TOP_K = 10
+
+REGULAR_TO_FINAL = dict((regular, final) for final, regular in FINAL_LETTERS.items())
+
+""" Fixtures """
+def randomWord(random_generator):
+    word = ''.join(random_generator.choice(REGULAR_LETTERS) for _ in range(random_generator.choice(WORDS_LENGTHS)))
+    return word[:-1] + REGULAR_TO_FINAL.get(word[-1], word[-1])
+
+def createStore(path, words, dimension, random_generator):
+    vocabulary = set()
+    while len(vocabulary) < words:
+        vocabulary.add(randomWord(random_generator))
+    random_state = numpy.random.RandomState(random_generator.randint(0, 2 ** 31))
+    topics = random_state.randn(TOPICS, dimension).astype(numpy.float32)
+    vectors = topics[random_state.zipf(1.3, words) % TOPICS] + random_state.randn(words, dimension).astype(numpy.float32)
+    saveStore(path, vectors, sorted(vocabulary), 'synthetic')
+    saveLengthIndex(path, buildLengthIndex(loadStore(path)))
+
+def createTitles(path, vocabulary, titles, random_generator):
+    lookup_dict = {}
+    anagram_dict = {}
+    for _ in range(titles):
+        title_words = random_generator.sample(vocabulary, random_generator.choice([1, 2, 2, 3]))
+        for word in title_words:
+            lookup_dict.setdefault(word, []).extend(adjacent for adjacent in title_words if adjacent != word)
+        title = ' '.join(title_words)
+        anagram_dict.setdefault(sortedLetters(lettersCounts(title_words)), []).append(title)
+    with codecs.open(path, 'w', 'utf-8') as f:
+        json.dump({ 'lookupDict': lookup_dict, 'anagramDict': anagram_dict }, f, ensure_ascii=False)
+
+# Same as findPotentialAnagramsWordGroupsInVerbalClue of the JS app
+def anagramWordsGroups(words, answer_length):
+    groups = []
+    start = 0
+    group_length = 0
+    for end in range(len(words)):
+        group_length += len(words[end])
+        while group_length > answer_length and start <= end:
+            group_length -= len(words[start])
+            start += 1
+        if group_length == answer_length:
+            groups.append((start, end))
+            group_length -= len(words[start])
+            start += 1
+    return groups
+
+# Same as createHebrewAnagrams of the JS app
+def hebrewAnagrams(words, words_length):
+    letters = ''.join(FINAL_LETTERS.get(letter, letter) for letter in ''.join(words))
+    anagrams = []
+    for permutation in sorted(set(''.join(characters) for characters in itertools.permutations(letters))):
+        if permutation != letters:
+            segments = []
+            for length in words_length:
+                segment, permutation = permutation[:length], permutation[length:]
+                segments.append(segment[:-1] + REGULAR_TO_FINAL.get(segment[-1], segment[-1]))
+            anagrams.append(segments)
+    return anagrams
+
+def createDefinition(vocabulary, random_generator):
+    clue_words = [randomWord(random_generator) if random_generator.random() < OOV_RATE else random_generator.choice(vocabulary)
+                  for _ in range(random_generator.randint(2, 5))]
+    # the solution has the length of a group of clue words, so the clue has anagram divisions
+    start = random_generator.randrange(len(clue_words))
+    answer_length = sum(len(word) for word in clue_words[start:start + random_generator.choice([1, 2])])
+    words_length = [answer_length]
+    if answer_length >= 6 and random_generator.random() < 0.3:
+        first_length = random_generator.randint(2, answer_length - 2)
+        words_length = [first_length, answer_length - first_length]
+
+    anagram_divisions = []
+    for group_start, group_end in anagramWordsGroups(clue_words, answer_length):
+        second_part = clue_words[group_start:group_end + 1]
+        division = { 'firstPart': clue_words[:group_start] + clue_words[group_end + 1:], 'secondPart': second_part,
+                     'sortedAnagramLetters': sortedLetters(lettersCounts(second_part)) }
+        if answer_length <= MAX_LENGTH_FOR_ANAGRAMS:
+            division['anagrams'] = hebrewAnagrams(second_part, words_length)
+        anagram_divisions.append(division)
+
+    divisions = { 'multiwordDivisions': [clue_words],
+                  'regularDivisons': [{ 'firstPart': clue_words[:i], 'secondPart': clue_words[i:] } for i in range(1, len(clue_words))] }
+    if anagram_divisions:
+        divisions['anagramDivisions'] = anagram_divisions
+    definition = { 'verbalClue': ' '.join(clue_words), 'wordsLength': [str(length) for length in words_length], 'composer': 'synthetic' }
+    return { 'definition': definition, 'divisions': divisions }
+
+def createDivisions(path, vocabulary, definitions, random_generator):
+    with codecs.open(path, 'w', 'utf-8') as f:
+        json.dump([createDefinition(vocabulary, random_generator) for _ in range(definitions)], f, ensure_ascii=False)
+
+# Generate the fixtures of a scale, if they weren't generated before
+def createFixtures(path, parameters, logger):
+    if os.path.isfile(os.path.join(path, 'divisions.json')):
+        return
+    logger.info("creating fixtures in %s..." % path)
+    random_generator = random.Random(0)
+    createStore(os.path.join(path, 'store'), parameters['words'], parameters['dimension'], random_generator)
+    frequent_words = loadStore(os.path.join(path, 'store'), limit=FREQUENT_WORDS).index2word
+    createTitles(os.path.join(path, 'titles.json'), frequent_words, parameters['titles'], random_generator)
+    createDivisions(os.path.join(path, 'divisions.json'), frequent_words, parameters['definitions'], random_generator)
+
+""" Benchmark """
+def timed(stages, stage, function, *args):
+    start = time.time()
+    result = function(*args)
+    stages[stage] = time.time() - start
+    return result
+
+def multiwordMeasures(suggester, suggester_data, titles_data, word_vectors, similarity_index, logger):
+    file_index = similarity_index.prepared(suggester_data)
+    return [suggester.getMultiwordMeasures(data["divisions"]["multiwordDivisions"], data["definition"]["wordsLength"],
+                                           'ft', titles_data, word_vectors, file_index, logger)
+            for data in suggester_data]
+
+def anagramMeasures(suggester, suggester_data, titles_data, word_vectors, logger):
+    return [suggester.getAnagramMeasures(data["definition"], data["divisions"], titles_data, word_vectors, logger)
+            if "anagramDivisions" in data["divisions"] else [] for data in suggester_data]
+
+def writeOutput(suggester, path, suggester_data, multiword_measures, anagram_measures):
+    candidates_data = [{ 'divisionsMeasures': { 'multiwordDivisionsMeasures': multiword, 'regularDivisionsMeasures': [],
+                                                'anagramDivisionsMeasures': anagram },
+                         'definition': data['definition'] }
+                       for data, multiword, anagram in zip(suggester_data, multiword_measures, anagram_measures)]
+    with codecs.open(path, 'w+', 'utf-8') as f:
+        json.dump(candidates_data, f, ensure_ascii=False, cls=suggester.NumpyEncoder)
+
+def benchmarkScale(suggester, path, parameters, logger):
+    # the suggester logs each definition and its OOV words, which is not part of the measured work
+    quiet_logger = logging.getLogger('suggester')
+    quiet_logger.setLevel(logging.ERROR)
+    stages = {}
+
+    def loadVectors():
+        word_vectors = suggester.loadWordVectors('ft', os.path.join(path, 'store'), str(parameters['words']), quiet_logger)
+        return word_vectors, BatchNeighboursIndex(createLengthIndex(word_vectors, os.path.join(path, 'store'), quiet_logger), TOP_K)
+    word_vectors, similarity_index = timed(stages, 'vectorsLoad', loadVectors)
+    titles_data = timed(stages, 'titlesLoad', suggester.loadTitles, os.path.join(path, 'titles.json'), quiet_logger)
+    titles_data["subAnagramIndex"] = timed(stages, 'subAnagramIndex', createSubAnagramIndex,
+                                             word_vectors, os.path.join(path, 'store'), quiet_logger)
+
+    with codecs.open(os.path.join(path, 'divisions.json'), 'r', 'utf-8-sig') as f:
+        suggester_data = json.load(f)
+    multiword_measures = timed(stages, 'multiwordMeasures', multiwordMeasures,
+                               suggester, suggester_data, titles_data, word_vectors, similarity_index, quiet_logger)
+    anagram_measures = timed(stages, 'anagramMeasures', anagramMeasures,
+                             suggester, suggester_data, titles_data, word_vectors, quiet_logger)
+    timed(stages, 'outputWrite', writeOutput,
+          suggester, os.path.join(path, 'candidates.json'), suggester_data, multiword_measures, anagram_measures)
+
+    anagram_divisions = [division for data in suggester_data for division in data["divisions"].get("anagramDivisions", [])]
+    counts = { 'definitions': len(suggester_data), 'anagramDivisions': len(anagram_divisions),
+               'anagrams': sum(len(division.get('anagrams', [])) for division in anagram_divisions) }
+    return { 'scale': os.path.basename(path), 'parameters': parameters, 'stages': stages, 'counts': counts }
+
+if __name__ == '__main__':
+    program = os.path.basename(sys.argv[0])
+    logger = logging.getLogger(program)
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
+    logging.root.setLevel(level=logging.INFO)
+    logger.info("running %s" % ' '.join(sys.argv))
+
+    scales = sys.argv[2:] or DEFAULT_SCALES
+    if len(sys.argv) < 2 or any(scale not in SCALES for scale in scales):
+        logger.info("parameters format is wrong - please use:")
+        logger.info("python pipeline_benchmark.py <work-dir> [<scale> ...]")
+        logger.info("possible scales are " + ', '.join(sorted(SCALES)))
+        raise SystemExit
+
+    work_dir = sys.argv[1]
+    # the suggester script is imported by its file name
+    suggester = importlib.import_module('candidates-suggester')
+
+    results = []
+    for scale in scales:
+        scale_path = os.path.join(work_dir, scale)
+        createFixtures(scale_path, SCALES[scale], logger)
+        result = benchmarkScale(suggester, scale_path, SCALES[scale], logger)
+        logger.info("%s: %s" % (scale, ', '.join("%s %.3fs" % (stage, seconds) for stage, seconds in result['stages'].items())))
+        results.append(result)
+
+    benchmark = { 'python': platform.python_version(), 'numpy': numpy.__version__, 'scales': results }
+    benchmark_file = os.path.join(work_dir, 'pipeline-benchmark-' + datetime.now().strftime('%Y-%m-%d-%H-%M-%S') + '.json')
+    with codecs.open(benchmark_file, 'w', 'utf-8') as f:
+        json.dump(benchmark, f, indent=2)
+    logger.info("Finished - results were saved into " + benchmark_file)
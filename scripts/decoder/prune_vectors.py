@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ Vocabulary pruning - exports the word vectors of the words that can appear in a puzzle.
+
+ The vectors limit of the suggester keeps the most frequent words, including many tokens which are never
+  a solution (punctuation, foreign words, numbers, lengths that no grid uses), and drops rare words which are valid solutions.
+ Instead, the exported vocabulary keeps:
+     - Hebrew words (Hebrew letters only) whose length is in one of the given ranges of lengths (default 2-15).
+       The ranges should also cover the words of the clues, which are needed for their similarity with the candidates.
+     - Every word of the titles dictionary (the adjacent words and the words of the anagram titles).
+ The words keep their order in the vectors file (descending frequency), so a vectors limit still keeps the most frequent words.
+
+ The input is a word vectors text file (word2vec format) or a store, which is read twice - once for choosing the words,
+  and once for copying their vectors. The output is a text file if its name ends with .vec or .txt (the lines of the
+  kept words are copied as they are), otherwise a word vectors store with its length index (see vectors_store.py):
+     python prune_vectors.py <wordvec-file> <titles-dictionary-file> <output> [<min-length>-<max-length> ...]
+"""
+
+import codecs
+import json
+import logging
+import os.path
+import re
+import sys
+
+import numpy
+
+from vectors_store import isStore, loadStore, saveStore
+from similarity_index import buildLengthIndex, saveLengthIndex
+from titles_index import isTitlesIndex, loadTitlesIndex
+
+HEBREW_WORD = re.compile(u'[א-ת]+$')
+DEFAULT_LENGTHS = [(2, 15)]
+TEXT_EXTENSIONS = ('.vec', '.txt')
+# Number of vectors between progress messages
+PROGRESS_VECTORS = 500000
+
+# <min-length>-<max-length>, returns None if the range is invalid
+def parseLengthsRange(text):
+    parts = text.split('-')
+    if len(parts) != 2 or not parts[0].isdigit() or not parts[1].isdigit() or int(parts[0]) > int(parts[1]):
+        return None
+    return int(parts[0]), int(parts[1])
+
+def loadTitlesData(titles_file):
+    if isTitlesIndex(titles_file):
+        return loadTitlesIndex(titles_file)
+    with codecs.open(titles_file, 'r', 'utf-8-sig') as f:
+        return json.load(f)
+
+# All the words of the titles dictionaries
+def titlesWords(titles_data):
+    words = set()
+    if "lookupDict" in titles_data:
+        lookup_dict = titles_data["lookupDict"]
+        if hasattr(lookup_dict, 'words'):
+            # compiled lookup dictionary, see titles_index.py - all the adjacent words are in its words table
+            words.update(lookup_dict.words[i] for i in range(len(lookup_dict.words)))
+        else:
+            for word, adjacent_words in lookup_dict.items():
+                words.add(word)
+                words.update(adjacent_words)
+    if "anagramDict" in titles_data:
+        anagram_dict = titles_data["anagramDict"]
+        if hasattr(anagram_dict, 'titles'):
+            titles = (anagram_dict.titles[i] for i in range(len(anagram_dict.titles)))
+        else:
+            titles = (title for key_titles in anagram_dict.values() for title in key_titles)
+        for title in titles:
+            words.update(title.split(' '))
+    words.discard('')
+    return words
+
+def isPuzzleWord(word, lengths, titles_words):
+    if word in titles_words:
+        return True
+    return HEBREW_WORD.match(word) is not None and any(min_length <= len(word) <= max_length for min_length, max_length in lengths)
+
+# (word, line) of each vector in a text file, the line is kept as bytes, in the same way that gensim splits it
+def textVectorsLines(wv_file):
+    with open(wv_file, 'rb') as f:
+        f.readline()
+        for line in f:
+            yield line.split(b' ', 1)[0].decode('utf-8'), line
+
+def textVectorsHeader(wv_file):
+    with open(wv_file, 'rb') as f:
+        count, dimensions = f.readline().split()
+    return int(count), int(dimensions)
+
+# Positions of the kept words in the vectors file
+def keptPositions(words, lengths, titles_words, logger):
+    positions = []
+    for position, word in enumerate(words):
+        if isPuzzleWord(word, lengths, titles_words):
+            positions.append(position)
+        if (position + 1) % PROGRESS_VECTORS == 0:
+            logger.info("checked %d words, kept %d" % (position + 1, len(positions)))
+    return positions
+
+def pruneTextToText(wv_file, output, kept, dimensions):
+    kept = set(kept)
+    with open(output, 'wb') as f:
+        f.write(('%d %d\n' % (len(kept), dimensions)).encode('utf-8'))
+        for position, (_, line) in enumerate(textVectorsLines(wv_file)):
+            if position in kept:
+                f.write(line if line.endswith(b'\n') else line + b'\n')
+
+def prunedTextVectors(wv_file, kept, dimensions):
+    kept_set = set(kept)
+    vectors = numpy.zeros((len(kept), dimensions), dtype=numpy.float32)
+    index2word = []
+    for position, (word, line) in enumerate(textVectorsLines(wv_file)):
+        if position in kept_set:
+            vectors[len(index2word)] = numpy.array(line.rstrip().decode('utf-8').split(' ')[1:], dtype=numpy.float32)
+            index2word.append(word)
+    return vectors, index2word
+
+# Export the kept words, returns the number of kept words and the number of words in the input
+def pruneVectors(wv_file, titles_file, output, lengths, logger):
+    logger.info("loading titles dict file... ")
+    titles_words = titlesWords(loadTitlesData(titles_file))
+    logger.info("%d words in the titles" % len(titles_words))
+
+    to_text = output.endswith(TEXT_EXTENSIONS)
+    if isStore(wv_file):
+        word_vectors = loadStore(wv_file)
+        kept = keptPositions(word_vectors.index2word, lengths, titles_words, logger)
+        total = len(word_vectors.index2word)
+        vectors = word_vectors.vectors_norm[kept] * word_vectors.norms[kept][:, numpy.newaxis]
+        index2word = [word_vectors.index2word[position] for position in kept]
+        if to_text:
+            with codecs.open(output, 'w', 'utf-8') as f:
+                f.write('%d %d\n' % vectors.shape)
+                for word, vector in zip(index2word, vectors):
+                    f.write(word + ' ' + ' '.join('%f' % value for value in vector) + '\n')
+            return len(kept), total
+    else:
+        total, dimensions = textVectorsHeader(wv_file)
+        kept = keptPositions((word for word, _ in textVectorsLines(wv_file)), lengths, titles_words, logger)
+        logger.info("kept %d of %d words, writing %s..." % (len(kept), total, output))
+        if to_text:
+            pruneTextToText(wv_file, output, kept, dimensions)
+            return len(kept), total
+        vectors, index2word = prunedTextVectors(wv_file, kept, dimensions)
+
+    saveStore(output, vectors, index2word, wv_file)
+    saveLengthIndex(output, buildLengthIndex(loadStore(output)))
+    return len(kept), total
+
+if __name__ == '__main__':
+    program = os.path.basename(sys.argv[0])
+    logger = logging.getLogger(program)
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
+    logging.root.setLevel(level=logging.INFO)
+    logger.info("running %s" % ' '.join(sys.argv))
+
+    lengths = [parseLengthsRange(text) for text in sys.argv[4:]] or DEFAULT_LENGTHS
+    if len(sys.argv) < 4 or None in lengths:
+        logger.info("parameters format is wrong - please use:")
+        logger.info("python prune_vectors.py <wordvec-file> <titles-dictionary-file> <output> [<min-length>-<max-length> ...]")
+        raise SystemExit
+
+    wv_file, titles_file, output = sys.argv[1:4]
+    kept, total = pruneVectors(wv_file, titles_file, output, lengths, logger)
+    logger.info("Finished - saved %d of %d words into %s" % (kept, total, output))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+ Quantized vectors for the length-bucketed similarity index.
+
+ The nearest neighbours queries scan the vectors of the answer's length, so the scanned matrix
+  is the part of the vectors which has to stay in memory. Here it is kept in a compact form:
+     float16 - half of the float32 size.
+     int8 - a quarter of the float32 size, each row is kept as integers in [-127, 127] and a scale (float32),
+            the largest absolute value of the row is 127.
+ The queries themselves are full precision vectors, and the bucket is converted back to float32 in chunks of rows.
+
+ The compact scores are used only for choosing a short list of RESCORE_FACTOR times the requested candidates,
+  which is re-scored with the full precision vectors of the word vectors (the rows of the short list only),
+  so the candidates and their scores are exact, unless an exact top-k word fell out of the short list.
+ The full precision matrix of a word vectors store (see vectors_store.py) stays memory-mapped on disk,
+  and only the rows of the short lists are read, so a much larger vocabulary fits in the same memory.
+  The suggester requires a store for quantization, since with a text vectors file the full precision vectors
+  are kept in memory anyway.
+
+ The quantized vectors are computed on the first run and saved into the store next to the length index,
+  with the fingerprint of the store, so they are computed again after the store is written again.
+"""
+
+import os.path
+
+import numpy
+
+from vectors_store import unitVector, topIndices, isDerivedFresh, saveDerivedFingerprint
+from similarity_index import LengthBucketedIndex, MOST_SIMILAR, MOST_SIMILAR_COSMUL, EMPTY_IDS
+
+QUANTIZATIONS = ('float16', 'int8')
+QUANTIZED_DTYPES = { 'float16': numpy.float16, 'int8': numpy.int8 }
+QUANTIZED_VECTORS_FILE = 'length-vectors-%s.npy'
+INT8_SCALES_FILE = 'length-scales-int8.npy'
+INT8_MAX = 127
+
+# Size of the short list that is re-scored, relative to the requested candidates
+RESCORE_FACTOR = 4
+# Number of rows that are converted to float32 at once
+ROWS_CHUNK_SIZE = 2 ** 16
+
+# Quantize the rows of a (possibly memory-mapped) matrix in chunks, returns the codes and the scales (int8 only)
+def quantizeVectors(vectors, quantization):
+    codes = numpy.empty(vectors.shape, dtype=QUANTIZED_DTYPES[quantization])
+    scales = numpy.empty(len(vectors), dtype=numpy.float32) if quantization == 'int8' else None
+    for start in range(0, len(vectors), ROWS_CHUNK_SIZE):
+        chunk = numpy.asarray(vectors[start:start + ROWS_CHUNK_SIZE], dtype=numpy.float32)
+        end = start + len(chunk)
+        if scales is None:
+            codes[start:end] = chunk
+        else:
+            chunk_scales = numpy.abs(chunk).max(axis=1) / INT8_MAX
+            codes[start:end] = numpy.round(chunk / numpy.where(chunk_scales > 0, chunk_scales, 1)[:, numpy.newaxis])
+            scales[start:end] = chunk_scales
+    return codes, scales
+
+class QuantizedLengthIndex(LengthBucketedIndex):
+    # vectors - the quantized vectors in the order of the length index, scales - the scale of each row (int8 only)
+    def __init__(self, word_vectors, ids, vectors, scales, buckets):
+        LengthBucketedIndex.__init__(self, word_vectors, ids, vectors, buckets)
+        self.scales = scales
+
+    # Scores of the query vectors (rows) with the words of the bucket (columns)
+    def bucketScores(self, words_length, query_vectors):
+        if words_length not in self.buckets:
+            return numpy.zeros((len(query_vectors), 0), dtype=numpy.float32)
+        start, end = self.buckets[words_length]
+        query_vectors = numpy.asarray(query_vectors, dtype=numpy.float32)
+        scores = numpy.empty((len(query_vectors), end - start), dtype=numpy.float32)
+        for chunk_start in range(start, end, ROWS_CHUNK_SIZE):
+            chunk_end = min(end, chunk_start + ROWS_CHUNK_SIZE)
+            chunk = self.vectors[chunk_start:chunk_end].astype(numpy.float32)
+            scores[:, chunk_start - start:chunk_end - start] = query_vectors.dot(chunk.T)
+        if self.scales is not None:
+            scores *= self.scales[start:end]
+        return scores
+
+    def shortlistSize(self, topn):
+        return RESCORE_FACTOR * topn
+
+    # Re-score the short list of positions in the bucket with the full precision vectors
+    def shortlistCandidates(self, method, ids, dists, best, query_indices, topk):
+        if len(best) == 0:
+            return []
+        shortlist_ids = ids[best]
+        vectors_norm = self.word_vectors.vectors_norm
+        vectors = vectors_norm[shortlist_ids]
+        query_vectors = vectors_norm[query_indices]
+        if method == MOST_SIMILAR:
+            exact_dists = vectors.dot(unitVector(query_vectors.mean(axis=0)))
+        else:
+            exact_dists = numpy.prod((1 + vectors.dot(query_vectors.T)) / 2, axis=1) / (1 + 0.000001)
+        return self.candidatesOf(shortlist_ids, exact_dists, numpy.argsort(exact_dists)[::-1], query_indices, topk)
+
+    # Same results as LengthBucketedIndex.mostSimilar, unless an exact candidate is not in the short list
+    def mostSimilar(self, words, words_length, topk):
+        indices = self.wordIndices(words)
+        mean = unitVector(self.word_vectors.vectors_norm[indices].mean(axis=0))
+        dists = self.bucketScores(words_length, mean[numpy.newaxis, :])[0]
+        return self.shortlistOf(MOST_SIMILAR, words_length, dists, indices, topk)
+
+    def mostSimilarCosmul(self, words, words_length, topk):
+        indices = self.wordIndices(words)
+        scores = self.bucketScores(words_length, self.word_vectors.vectors_norm[indices])
+        dists = numpy.prod((1 + scores) / 2, axis=0) / (1 + 0.000001)
+        return self.shortlistOf(MOST_SIMILAR_COSMUL, words_length, dists, indices, topk)
+
+    def shortlistOf(self, method, words_length, dists, indices, topk):
+        ids = self.ids[slice(*self.buckets[words_length])] if words_length in self.buckets else EMPTY_IDS
+        best = topIndices(dists, self.shortlistSize(topk + len(set(indices))))
+        return self.shortlistCandidates(method, ids, dists, best, indices, topk)
+
+def quantizedFiles(store_path, quantization):
+    files = [os.path.join(store_path, QUANTIZED_VECTORS_FILE % quantization)]
+    if quantization == 'int8':
+        files.append(os.path.join(store_path, INT8_SCALES_FILE))
+    return files
+
+def hasQuantizedIndex(store_path, quantization):
+    return (all(os.path.isfile(path) for path in quantizedFiles(store_path, quantization)) and
+            isDerivedFresh(store_path, quantizedIndexName(quantization)))
+
+def quantizedIndexName(quantization):
+    return 'quantized-' + quantization
+
+def saveQuantizedIndex(store_path, quantized_index, quantization):
+    arrays = [quantized_index.vectors] + ([quantized_index.scales] if quantization == 'int8' else [])
+    for path, array in zip(quantizedFiles(store_path, quantization), arrays):
+        numpy.save(path, array)
+    saveDerivedFingerprint(store_path, quantizedIndexName(quantization))
+
+# The quantized vectors are memory-mapped as the rest of the store, and the buckets are taken from the
+# (already loaded) length index, so a vectors limit cuts them in the same way
+def loadQuantizedIndex(store_path, length_index, quantization):
+    arrays = [numpy.load(path, mmap_mode='r').view(numpy.ndarray) for path in quantizedFiles(store_path, quantization)]
+    scales = arrays[1] if quantization == 'int8' else None
+    return QuantizedLengthIndex(length_index.word_vectors, length_index.ids, arrays[0], scales, length_index.buckets)
+
+# Use the saved quantized vectors of a store if exist, otherwise quantize the length index (and save it into the store)
+def createQuantizedIndex(length_index, wv_file, quantization, logger):
+    if os.path.isdir(wv_file) and hasQuantizedIndex(wv_file, quantization):
+        return loadQuantizedIndex(wv_file, length_index, quantization)
+    logger.info("quantizing the word vectors into %s..." % quantization)
+    vectors, scales = quantizeVectors(length_index.vectors, quantization)
+    quantized_index = QuantizedLengthIndex(length_index.word_vectors, length_index.ids, vectors, scales, length_index.buckets)
+    if os.path.isdir(wv_file):
+        saveQuantizedIndex(wv_file, quantized_index, quantization)
+        logger.info("quantized vectors were saved into " + wv_file)
+    return quantized_index
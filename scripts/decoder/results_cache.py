@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+ Content-addressed cache of the candidates of definitions, kept on disk between runs.
+
+ Divisions files are often submitted again with a few changes, and the candidates of a definition
+  depend only on its own definition and divisions, the word vectors and the titles dictionaries.
+ So each candidates record is saved under the hash of the definition and divisions (as canonical json),
+  together with a fingerprint of the word vectors and the titles, and a definition which was already
+  searched with the same data is read from the cache instead of being searched again.
+ Each record is a json file in the cache directory (in sub-directories by the first characters of the hash).
+  A record is written into a temporary file which replaces the record at once, so several threads
+  and an interrupted run won't leave a broken record. The directory can be deleted at any time.
+ RESULTS_CACHE_VERSION should be changed when the candidates of the suggester are changed.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+
+RESULTS_CACHE_VERSION = 1
+
+# Path, size and modification time of a file, a directory is identified by a file inside it
+def fileFingerprint(path, inner_file=None):
+    stat_path = os.path.join(path, inner_file) if inner_file and os.path.isdir(path) else path
+    stat = os.stat(stat_path)
+    return '%s:%d:%d' % (os.path.abspath(path), stat.st_size, int(stat.st_mtime))
+
+class ResultsCache(object):
+    # fingerprint - identifies the word vectors, the titles and the options the candidates were searched with
+    def __init__(self, path, fingerprint, json_encoder=None):
+        self.path = path
+        self.fingerprint = '%d:%s' % (RESULTS_CACHE_VERSION, fingerprint)
+        self.json_encoder = json_encoder
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, defintionSuggestedData):
+        payload = json.dumps([defintionSuggestedData.get("definition"), defintionSuggestedData.get("divisions")],
+                             sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256((self.fingerprint + '\n' + payload).encode('utf-8')).hexdigest()
+
+    def recordPath(self, key):
+        return os.path.join(self.path, key[:2], key + '.json')
+
+    # The candidates record of the key, or None if it isn't in the cache
+    def get(self, key):
+        record_path = self.recordPath(key)
+        if not os.path.isfile(record_path):
+            self.misses += 1
+            return None
+        with codecs.open(record_path, 'r', 'utf-8') as f:
+            record = json.load(f)
+        self.hits += 1
+        return record
+
+    def put(self, key, candidateData):
+        record_path = self.recordPath(key)
+        if not os.path.isdir(os.path.dirname(record_path)):
+            os.makedirs(os.path.dirname(record_path))
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(record_path))
+        with codecs.getwriter('utf-8')(os.fdopen(fd, 'wb')) as f:
+            json.dump(candidateData, f, ensure_ascii=False, cls=self.json_encoder)
+        os.replace(temp_path, record_path)
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+ Length-bucketed similarity index for the nearest neighbours queries of the suggester.
+
+ Candidates are useful only if their length fits the length of the words in the answer,
+  so the normalized vectors are split into buckets by the (Hebrew) length of their words,
+  and each query scans only the bucket of the requested length.
+  A query returns exactly the top-k candidates of the requested length in one pass.
+
+ Inside a bucket, the words keep the order of the vectors file (descending frequency),
+  so a vectors limit is a prefix of each bucket.
+ The buckets can be saved into a word vectors store (see vectors_store.py), and then they are
+  memory-mapped as the rest of the store.
+"""
+
+import codecs
+import json
+import os.path
+
+import numpy
+
+from vectors_store import unitVector, topIndices
+
+LENGTH_VECTORS_FILE = 'length-vectors.npy'
+LENGTH_IDS_FILE = 'length-ids.npy'
+LENGTH_BUCKETS_FILE = 'length-buckets.json'
+
+EMPTY_IDS = numpy.zeros(0, dtype=numpy.int64)
+
+# The kinds of nearest neighbours queries
+MOST_SIMILAR = 'mostSimilar'
+MOST_SIMILAR_COSMUL = 'mostSimilarCosmul'
+
+# Index of word in the vectors matrix, both for gensim KeyedVectors and StoredVectors
+def wordIndex(word_vectors, word):
+    if word not in word_vectors.vocab:
+        raise KeyError("word '%s' not in vocabulary" % word)
+    vocab_entry = word_vectors.vocab[word]
+    return getattr(vocab_entry, 'index', vocab_entry)
+
+# The query vectors of mostSimilar and mostSimilarCosmul together - the mean of the words (a single word is its own mean),
+# followed by each of the words once. The scores are the same as the scores of the batch scoring (see batch_index.py).
+def fusedQueryVectors(vectors_norm, indices):
+    query_vectors = [vectors_norm[index] for index in sorted(set(indices))]
+    if len(indices) > 1:
+        query_vectors.insert(0, unitVector(vectors_norm[indices].mean(axis=0)))
+    return numpy.vstack(query_vectors)
+
+# The mostSimilar and the 3CosMul dists from the scores of the fused query vectors (rows)
+def fusedDists(scores, indices):
+    unique_indices = sorted(set(indices))
+    rows = dict((index, row) for row, index in enumerate(unique_indices, len(scores) - len(unique_indices)))
+    cosmul_dists = numpy.prod([((1 + scores[rows[index]]) / 2) for index in indices], axis=0) / (1 + 0.000001)
+    return scores[0], cosmul_dists
+
+# Rows of a matrix whose rows were reordered, read by their original indices
+class ReorderedRows(object):
+    # positions - the row in the matrix of each original index
+    def __init__(self, matrix, positions):
+        self.matrix = matrix
+        self.positions = positions
+        self.shape = matrix.shape
+        self.dtype = matrix.dtype
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __getitem__(self, indices):
+        return self.matrix[self.positions[indices]]
+
+class LengthBucketedIndex(object):
+    # the queries of a bucket can be scored together (see batch_index.py)
+    batched = True
+
+    # ids - the indices of the words in the vectors matrix, sorted by length (stable),
+    # vectors - the normalized vectors in the same order, buckets - length: (start, end)
+    def __init__(self, word_vectors, ids, vectors, buckets):
+        self.word_vectors = word_vectors
+        self.ids = ids
+        self.vectors = vectors
+        self.buckets = buckets
+
+    def wordIndices(self, words):
+        return [wordIndex(self.word_vectors, word) for word in words]
+
+    def bucket(self, words_length):
+        if words_length not in self.buckets:
+            return EMPTY_IDS, self.vectors[:0]
+        start, end = self.buckets[words_length]
+        return self.ids[start:end], self.vectors[start:end]
+
+    # Scores of the query vectors (rows) with the words of the bucket (columns)
+    def bucketScores(self, words_length, query_vectors):
+        _, vectors = self.bucket(words_length)
+        return query_vectors.dot(vectors.T)
+
+    # Number of best positions that are needed for topn candidates, see quantized_index.py
+    def shortlistSize(self, topn):
+        return topn
+
+    # Candidates of the best positions of a query, the scores are exact
+    def shortlistCandidates(self, method, ids, dists, best, query_indices, topk):
+        return self.candidatesOf(ids, dists, best, query_indices, topk)
+
+    # Equivalent to word_vectors.most_similar(positive=words), limited to words of the given length
+    def mostSimilar(self, words, words_length, topk):
+        indices = self.wordIndices(words)
+        mean = unitVector(self.word_vectors.vectors_norm[indices].mean(axis=0))
+        ids, vectors = self.bucket(words_length)
+        dists = vectors.dot(mean)
+        return self.bestWords(ids, dists, indices, topk)
+
+    # Equivalent to word_vectors.most_similar_cosmul(positive=words), limited to words of the given length
+    def mostSimilarCosmul(self, words, words_length, topk):
+        indices = self.wordIndices(words)
+        ids, vectors = self.bucket(words_length)
+        pos_dists = [((1 + vectors.dot(self.word_vectors.vectors_norm[index])) / 2) for index in indices]
+        dists = numpy.prod(pos_dists, axis=0) / (1 + 0.000001)
+        return self.bestWords(ids, dists, indices, topk)
+
+    # Both mostSimilar and mostSimilarCosmul from one scan of the bucket, see fusedQueryVectors
+    def mostSimilarAndCosmul(self, words, words_length, topk):
+        indices = self.wordIndices(words)
+        ids, _ = self.bucket(words_length)
+        scores = self.bucketScores(words_length, fusedQueryVectors(self.word_vectors.vectors_norm, indices))
+        dists, cosmul_dists = fusedDists(scores, indices)
+        return (self.bestShortlist(MOST_SIMILAR, ids, dists, indices, topk),
+                self.bestShortlist(MOST_SIMILAR_COSMUL, ids, cosmul_dists, indices, topk))
+
+    def bestShortlist(self, method, ids, dists, query_indices, topk):
+        best = topIndices(dists, self.shortlistSize(topk + len(set(query_indices))))
+        return self.shortlistCandidates(method, ids, dists, best, query_indices, topk)
+
+    # The words of the query are not candidates
+    def bestWords(self, ids, dists, query_indices, topk):
+        best = topIndices(dists, topk + len(set(query_indices)))
+        return self.candidatesOf(ids, dists, best, query_indices, topk)
+
+    # (word, score) of the best positions in the bucket, without the words of the query
+    def candidatesOf(self, ids, dists, best, query_indices, topk):
+        ignored = set(query_indices)
+        index2word = self.word_vectors.index2word
+        result = [(index2word[ids[i]], float(dists[i])) for i in best if ids[i] not in ignored]
+        return result[:topk]
+
+# shared - the normalized vectors of word_vectors are replaced by the rows of the index (in memory vectors),
+# so the process doesn't keep both the original and the reordered matrices
+def buildLengthIndex(word_vectors, shared=False):
+    word_vectors.init_sims()
+    lengths = numpy.array([len(word) for word in word_vectors.index2word], dtype=numpy.int64)
+    ids = numpy.argsort(lengths, kind='stable')
+    vectors = numpy.ascontiguousarray(word_vectors.vectors_norm[ids])
+    if shared:
+        positions = numpy.empty_like(ids)
+        positions[ids] = numpy.arange(len(ids))
+        word_vectors.vectors_norm = ReorderedRows(vectors, positions)
+    return LengthBucketedIndex(word_vectors, ids, vectors, bucketsOfSortedLengths(lengths[ids]))
+
+def bucketsOfSortedLengths(sorted_lengths):
+    buckets = {}
+    for length in numpy.unique(sorted_lengths):
+        start = int(numpy.searchsorted(sorted_lengths, length, side='left'))
+        end = int(numpy.searchsorted(sorted_lengths, length, side='right'))
+        buckets[int(length)] = (start, end)
+    return buckets
+
+def hasLengthIndex(store_path):
+    return os.path.isfile(os.path.join(store_path, LENGTH_BUCKETS_FILE))
+
+def saveLengthIndex(store_path, length_index):
+    numpy.save(os.path.join(store_path, LENGTH_VECTORS_FILE), length_index.vectors)
+    numpy.save(os.path.join(store_path, LENGTH_IDS_FILE), length_index.ids)
+    buckets = [[length, start, end] for length, (start, end) in sorted(length_index.buckets.items())]
+    with codecs.open(os.path.join(store_path, LENGTH_BUCKETS_FILE), 'w', 'utf-8') as f:
+        json.dump(buckets, f)
+
+# Memory-map the index of a store. With vectors limit, each bucket is cut to the words under the limit,
+# which are the first words of the bucket.
+def loadLengthIndex(store_path, word_vectors):
+    ids = numpy.load(os.path.join(store_path, LENGTH_IDS_FILE), mmap_mode='r')
+    vectors = numpy.load(os.path.join(store_path, LENGTH_VECTORS_FILE), mmap_mode='r')
+    with codecs.open(os.path.join(store_path, LENGTH_BUCKETS_FILE), 'r', 'utf-8') as f:
+        saved_buckets = json.load(f)
+
+    limit = len(word_vectors.index2word)
+    buckets = {}
+    for length, start, end in saved_buckets:
+        limited_end = start + int(numpy.searchsorted(ids[start:end], limit))
+        buckets[length] = (start, limited_end)
+    return LengthBucketedIndex(word_vectors, ids, vectors, buckets)
+
+# Use the saved index of a store if exists, otherwise build it in memory
+def createLengthIndex(word_vectors, wv_file, logger):
+    if os.path.isdir(wv_file) and hasLengthIndex(wv_file):
+        return loadLengthIndex(wv_file, word_vectors)
+    logger.info("building length index of the word vectors...")
+    return buildLengthIndex(word_vectors, shared=True)
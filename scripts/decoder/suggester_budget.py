@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+ Time budgets of the anytime mode of the suggester.
+
+ A pathological clue (dozens of divisions, thousands of anagrams) can take much longer than the other clues.
+ With a budget, each definition gets a deadline - its own budget, cut by the remaining budget of its divisions file.
+ The techniques check the deadline before each division, and once it has passed they skip the rest of their work,
+  so the candidates that were found until then are returned, and the result is marked as truncated.
+ The techniques of a definition run from the cheapest to the most expensive (see suggestDefinitionCandidates),
+  so a truncated result still has the candidates of the titles lookups.
+ The nearest neighbours queries of the file are scored together before the definitions (see batch_index.py),
+  and the scoring checks the deadline of the file between its chunks. The queries that were scored (or cached)
+  are only looked up, so they are filled after the deadline too, and they don't make the result truncated.
+
+ Without a budget the definitions get NO_DEADLINE, which never passes, and the results are not marked.
+"""
+
+import time
+
+# status of a result in the anytime mode
+COMPLETE = 'complete'
+TRUNCATED = 'truncated'
+
+class NoDeadline(object):
+    active = False
+    truncated = False
+
+    def expired(self):
+        return False
+
+NO_DEADLINE = NoDeadline()
+
+class Deadline(object):
+    active = True
+
+    # seconds - None for no limit, parent - the deadline can't be after the parent deadline
+    def __init__(self, seconds, parent=None):
+        self.end = time.monotonic() + seconds if seconds is not None else float('inf')
+        if parent is not None:
+            self.end = min(self.end, parent.end)
+        self.truncated = False
+
+    # Checked before each part of the work - a part that is skipped after the deadline makes the result truncated
+    def expired(self):
+        if not self.truncated and time.monotonic() >= self.end:
+            self.truncated = True
+        return self.truncated
+
+class FileBudget(object):
+    def __init__(self, definition_seconds, file_seconds):
+        self.definition_seconds = definition_seconds
+        self.deadline = Deadline(file_seconds)
+
+    # The deadline of a definition starts when it is searched
+    def definitionDeadline(self):
+        return Deadline(self.definition_seconds, self.deadline)
+
+class Budget(object):
+    # budgets in seconds, None for no limit
+    def __init__(self, definition_seconds=None, file_seconds=None):
+        self.definition_seconds = definition_seconds
+        self.file_seconds = file_seconds
+
+    # The budget of a divisions file starts when it is searched
+    def startFile(self):
+        return FileBudget(self.definition_seconds, self.file_seconds)
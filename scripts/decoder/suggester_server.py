@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+ Local HTTP/JSON service of the candidates suggester.
+
+ The word vectors and the titles dictionaries are loaded once, and divisions data
+  (the content of a divisions file, created by the JS app) is sent over HTTP:
+     POST /candidates - the body is the divisions data, the response is the candidates data
+                        in the same structure of the candidates file.
+     GET /health - returns {"status": "ok"} when the service is ready.
+     GET /metrics - timers and counters of the suggester in the Prometheus text format (when the stats are enabled).
+
+ Connections are handled by an asyncio front end, and the candidates are searched
+  in a pool of worker threads, which share the loaded word vectors and dictionaries
+  (most of the time is spent in numpy, which releases the GIL).
+ Connections are kept alive, so a client can send many requests over one connection.
+"""
+
+import asyncio
+import codecs
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+CANDIDATES_PATH = '/candidates'
+HEALTH_PATH = '/health'
+METRICS_PATH = '/metrics'
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+TEXT_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Maximal size of request body
+MAX_BODY_SIZE = 256 * 1024 * 1024
+
+REASONS = { 200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error' }
+
+class BadRequest(Exception):
+    def __init__(self, message, status=400):
+        Exception.__init__(self, message)
+        self.status = status
+
+def jsonBody(data, json_encoder):
+    return json.dumps(data, ensure_ascii=False, cls=json_encoder).encode('utf-8')
+
+class SuggesterServer(object):
+    # suggest - function that receives divisions data and returns candidates data,
+    # metrics - function that returns the metrics text, or None if there are no metrics
+    def __init__(self, suggest, threads, json_encoder, logger, metrics=None):
+        self.suggest = suggest
+        self.metrics = metrics
+        self.json_encoder = json_encoder
+        self.logger = logger
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    # Runs in a worker thread
+    def candidatesResponse(self, body):
+        try:
+            suggester_data = json.loads(codecs.decode(body, 'utf-8-sig'))
+        except ValueError as e:
+            return 400, jsonBody({ 'error': 'invalid divisions data: ' + str(e) }, self.json_encoder)
+        if not isinstance(suggester_data, list):
+            return 400, jsonBody({ 'error': 'divisions data should be a list of definitions' }, self.json_encoder)
+        candidatesData = self.suggest(suggester_data)
+        return 200, jsonBody(candidatesData, self.json_encoder)
+
+    async def readRequest(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, path, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise BadRequest('invalid request line')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = b''
+        try:
+            length = int(headers.get('content-length', '0') or '0')
+        except ValueError:
+            raise BadRequest('invalid content length')
+        if length > MAX_BODY_SIZE:
+            raise BadRequest('request body is too large', 413)
+        if length > 0:
+            body = await reader.readexactly(length)
+        keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+        return method, path.split('?')[0], body, keep_alive
+
+    # Returns the status, the response body and its content type
+    async def respond(self, method, path, body):
+        if path == HEALTH_PATH:
+            return 200, b'{"status": "ok"}', JSON_CONTENT_TYPE
+        if path == METRICS_PATH and self.metrics is not None:
+            return 200, self.metrics().encode('utf-8'), TEXT_CONTENT_TYPE
+        if path != CANDIDATES_PATH:
+            return 404, jsonBody({ 'error': 'unknown path ' + path }, self.json_encoder), JSON_CONTENT_TYPE
+        if method != 'POST':
+            return 405, jsonBody({ 'error': 'use POST with divisions data' }, self.json_encoder), JSON_CONTENT_TYPE
+
+        loop = asyncio.get_event_loop()
+        try:
+            status, response = await loop.run_in_executor(self.executor, self.candidatesResponse, body)
+        except Exception as e:
+            self.logger.exception(e)
+            return 500, jsonBody({ 'error': str(e) }, self.json_encoder), JSON_CONTENT_TYPE
+        return status, response, JSON_CONTENT_TYPE
+
+    async def handleConnection(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self.readRequest(reader)
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    status, response, content_type = await self.respond(method, path, body)
+                except BadRequest as e:
+                    keep_alive = False
+                    status, response, content_type = e.status, jsonBody({ 'error': str(e) }, self.json_encoder), JSON_CONTENT_TYPE
+
+                head = ('HTTP/1.1 %d %s\r\nContent-Type: %s\r\n'
+                        'Content-Length: %d\r\nConnection: %s\r\n\r\n'
+                        % (status, REASONS[status], content_type, len(response), 'keep-alive' if keep_alive else 'close'))
+                writer.write(head.encode('latin-1') + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def serveForever(self, host, port):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(asyncio.start_server(self.handleConnection, host, port))
+        self.logger.info("serving candidates on http://%s:%d%s" % (host, port, CANDIDATES_PATH))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            self.logger.info("stopping the server")
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            self.executor.shutdown()
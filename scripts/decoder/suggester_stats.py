@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+ Timers and counters of the suggester stages and techniques.
+
+ The stages (multiword measures, titles lookups, anagram measures, nearest neighbours queries, loading and writing files)
+  are timed by the timedStage decorator or by a StageTimer, and the techniques count their queries,
+  out of vocabulary words and candidates. The latency of each definition is kept for percentiles.
+ The times of the stages are inclusive - the time of the multiword measures contains the time of its titles lookups.
+
+ The collector is disabled by default: it is a NullStats, which does nothing,
+  so the instrumented code pays only for a check or an empty call.
+ After enable(), the stats are summarized as json (for each divisions file),
+  or as text in the Prometheus exposition format (for the local HTTP service).
+"""
+
+import collections
+import functools
+import threading
+import time
+
+# Number of the latest definitions latencies that are kept for the percentiles of a long-running service
+LATENCIES_WINDOW = 10000
+PERCENTILES = [50, 90, 99]
+METRICS_PREFIX = 'crcr_suggester'
+
+# rate name: (counter, total counter)
+RATES = {
+    'multiwordOOVRate': ('multiwordOOVWords', 'multiwordWords'),
+    'titlesOOVRate': ('titlesCandidatesOOV', 'titlesCandidates'),
+    'anagramsOOVRate': ('anagramGroupsOOV', 'anagramGroups'),
+    'titlesAnagramsOOVRate': ('titlesAnagramsOOV', 'titlesAnagrams'),
+    # queries that weren't prepared in batch or found in the cache, and were searched one by one
+    'searchedQueriesRate': ('searchedQueries', 'queries'),
+    'cachedQueriesRate': ('cachedQueries', 'queries'),
+    # definitions whose time budget has passed before all their techniques ran, see suggester_budget.py
+    'truncatedDefinitionsRate': ('truncatedDefinitions', 'budgetDefinitions'),
+}
+
+class NullStats(object):
+    enabled = False
+
+    def add(self, stage, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def latency(self, seconds):
+        pass
+
+class Stats(object):
+    enabled = True
+
+    def __init__(self, latencies_window=LATENCIES_WINDOW):
+        # the HTTP service handles several requests at the same time
+        self.lock = threading.Lock()
+        self.latencies_window = latencies_window
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.times = {}
+            self.calls = {}
+            self.counters = {}
+            self.latencies = collections.deque(maxlen=self.latencies_window)
+            self.definitions = 0
+            self.definitions_time = 0.0
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.times[stage] = self.times.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.definitions += 1
+            self.definitions_time += seconds
+
+    # The collected values, which can be merged into another Stats (of the process that forked the workers)
+    def state(self):
+        with self.lock:
+            return { 'times': dict(self.times), 'calls': dict(self.calls), 'counters': dict(self.counters),
+                     'latencies': list(self.latencies), 'definitions': self.definitions, 'definitionsTime': self.definitions_time }
+
+    def merge(self, state):
+        with self.lock:
+            for stage, seconds in state['times'].items():
+                self.times[stage] = self.times.get(stage, 0.0) + seconds
+            for stage, calls in state['calls'].items():
+                self.calls[stage] = self.calls.get(stage, 0) + calls
+            for name, value in state['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self.latencies.extend(state['latencies'])
+            self.definitions += state['definitions']
+            self.definitions_time += state['definitionsTime']
+
+    def latencyPercentiles(self):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return dict((percentile, 0.0) for percentile in PERCENTILES)
+        # nearest rank percentiles
+        return dict((percentile, latencies[max(0, -(-len(latencies) * percentile // 100) - 1)]) for percentile in PERCENTILES)
+
+    def summary(self):
+        with self.lock:
+            stages = dict((stage, { 'seconds': seconds, 'calls': self.calls[stage] }) for stage, seconds in self.times.items())
+            rates = dict((rate, self.counters.get(counter, 0) / float(self.counters[total]))
+                         for rate, (counter, total) in RATES.items() if self.counters.get(total))
+            definitions = { 'count': self.definitions,
+                            'meanMs': 1000 * self.definitions_time / self.definitions if self.definitions else 0.0,
+                            'maxMs': 1000 * max(self.latencies) if self.latencies else 0.0 }
+            for percentile, seconds in self.latencyPercentiles().items():
+                definitions['p%dMs' % percentile] = 1000 * seconds
+            return { 'stages': stages, 'counters': dict(self.counters), 'rates': rates, 'definitions': definitions }
+
+    # Text exposition format of Prometheus
+    def metricsText(self, prefix=METRICS_PREFIX):
+        with self.lock:
+            lines = ['# TYPE %s_stage_seconds_total counter' % prefix]
+            lines += ['%s_stage_seconds_total{stage="%s"} %f' % (prefix, stage, seconds) for stage, seconds in sorted(self.times.items())]
+            lines += ['# TYPE %s_stage_calls_total counter' % prefix]
+            lines += ['%s_stage_calls_total{stage="%s"} %d' % (prefix, stage, calls) for stage, calls in sorted(self.calls.items())]
+            lines += ['# TYPE %s_events_total counter' % prefix]
+            lines += ['%s_events_total{event="%s"} %d' % (prefix, name, value) for name, value in sorted(self.counters.items())]
+            lines += ['# TYPE %s_definition_latency_seconds summary' % prefix]
+            lines += ['%s_definition_latency_seconds{quantile="%s"} %f' % (prefix, percentile / 100.0, seconds)
+                      for percentile, seconds in sorted(self.latencyPercentiles().items())]
+            lines += ['%s_definition_latency_seconds_sum %f' % (prefix, self.definitions_time),
+                      '%s_definition_latency_seconds_count %d' % (prefix, self.definitions)]
+        return '\n'.join(lines) + '\n'
+
+# The collector of the process, NullStats until enable() is called
+collector = NullStats()
+
+def enable():
+    global collector
+    collector = Stats()
+    return collector
+
+# Adds the running time of the block to a stage, and its latency to the definitions latencies
+class StageTimer(object):
+    def __init__(self, stage, definition=False):
+        self.stage = stage
+        self.definition = definition
+
+    def __enter__(self):
+        self.start = time.time() if collector.enabled else None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            seconds = time.time() - self.start
+            collector.add(self.stage, seconds)
+            if self.definition:
+                collector.latency(seconds)
+        return False
+
+# Decorator that adds the running time of the function to a stage
+def timedStage(stage, definition=False):
+    def decorator(function):
+        @functools.wraps(function)
+        def timedFunction(*args, **kwargs):
+            if not collector.enabled:
+                return function(*args, **kwargs)
+            with StageTimer(stage, definition):
+                return function(*args, **kwargs)
+        return timedFunction
+    return decorator
+
+# Number of candidates - (word, score) pairs - in the measures of a definition
+def candidatesCount(measures):
+    if isinstance(measures, tuple):
+        return 1
+    if isinstance(measures, dict):
+        return sum(candidatesCount(value) for value in measures.values())
+    if isinstance(measures, list):
+        return sum(candidatesCount(value) for value in measures)
+    return 0
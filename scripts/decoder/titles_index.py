@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ Compiled titles dictionaries - a compact binary form of the titles dictionaries for the suggester.
+
+ Loading the titles json file takes several GB of RAM, and the multiword expressions lookup
+  builds new sets of words for each division.
+ The compiled index is a directory of arrays which are memory-mapped when it is loaded:
+     lookupDict - the words are interned into a table sorted by their (utf-8) bytes, the position of a word
+      in the table is its id. The adjacent words of each word are kept as a sorted list of ids (posting list),
+      all the lists are concatenated into one array, with an array of start positions (CSR format).
+      The shared words of several words are found by intersecting their posting lists,
+      from the shortest list to the longest one, using binary search in the longer list.
+     anagramDict - the sorted letters keys are kept in a sorted table, and the titles of each key
+      are kept one after another in a second table.
+ Both dictionaries support the part of the dict interface that is used by the suggester (in, [] and get).
+
+ Compilation of a titles json file (one time):
+     python titles_index.py <titles-dict-json> <titles-index-dir>
+"""
+
+import codecs
+import json
+import logging
+import os.path
+import sys
+
+import numpy
+
+INDEX_VERSION = 1
+META_FILE = 'meta.json'
+
+LOOKUP_WORDS = 'lookup-words'
+LOOKUP_INDPTR_FILE = 'lookup-indptr.npy'
+LOOKUP_INDICES_FILE = 'lookup-indices.npy'
+ANAGRAM_KEYS = 'anagram-keys'
+ANAGRAM_INDPTR_FILE = 'anagram-indptr.npy'
+ANAGRAM_TITLES = 'anagram-titles'
+
+def utf8Key(string):
+    return string.encode('utf-8')
+
+"""
+ Table of strings - the utf-8 bytes of all the strings are concatenated, with an array of start positions.
+"""
+class StringTable(object):
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def bytesAt(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        return self.bytesAt(i).decode('utf-8')
+
+    # Position of the string in a table that is sorted by utf-8 bytes, or -1 if it's not in the table
+    def find(self, string):
+        key = utf8Key(string)
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.bytesAt(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self.bytesAt(low) == key:
+            return low
+        return -1
+
+def saveStringTable(path, name, strings):
+    encoded = [utf8Key(string) for string in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(value) for value in encoded])
+    data = numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8)
+    numpy.save(os.path.join(path, name + '-offsets.npy'), offsets)
+    numpy.save(os.path.join(path, name + '.npy'), data)
+
+def loadStringTable(path, name):
+    offsets = numpy.load(os.path.join(path, name + '-offsets.npy'), mmap_mode='r')
+    data = numpy.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+    return StringTable(offsets, data)
+
+# Intersection of two sorted arrays of unique ids, by binary search of the shorter array's ids in the longer array
+def intersectSorted(shorter, longer):
+    if len(shorter) == 0 or len(longer) == 0:
+        return shorter[:0]
+    positions = numpy.searchsorted(longer, shorter)
+    positions[positions == len(longer)] = len(longer) - 1
+    return shorter[longer[positions] == shorter]
+
+"""
+ lookupDict - word: adjacent words in titles (multiword expressions)
+"""
+class LookupIndex(object):
+    def __init__(self, words, indptr, indices):
+        self.words = words
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return self.words.find(word) >= 0
+
+    def postingList(self, word_id):
+        return self.indices[self.indptr[word_id]:self.indptr[word_id + 1]]
+
+    def __getitem__(self, word):
+        word_id = self.words.find(word)
+        if word_id < 0:
+            raise KeyError(word)
+        return [self.words[adjacent_id] for adjacent_id in self.postingList(word_id)]
+
+    def get(self, word, default=None):
+        return self[word] if word in self else default
+
+    # Words that are adjacent to all the given words - same as findSharedWordsBetweenTitlesDicts for dicts:
+    # the first two words must be in the dictionary, the next words are ignored if they aren't in it (or have no adjacent words)
+    def sharedWords(self, words):
+        if len(words) < 2:
+            return []
+        first_ids = [self.words.find(word) for word in words[:2]]
+        if min(first_ids) < 0:
+            return []
+
+        posting_lists = [self.postingList(word_id) for word_id in first_ids]
+        for word in words[2:]:
+            word_id = self.words.find(word)
+            if word_id >= 0 and len(self.postingList(word_id)) > 0:
+                posting_lists.append(self.postingList(word_id))
+
+        # intersect from the shortest list, so the intermediate result is small
+        posting_lists.sort(key=len)
+        shared_ids = numpy.asarray(posting_lists[0])
+        for posting_list in posting_lists[1:]:
+            shared_ids = intersectSorted(shared_ids, posting_list)
+        return [self.words[word_id] for word_id in shared_ids]
+
+"""
+ anagramDict - sorted letters: titles made of these letters
+"""
+class AnagramIndex(object):
+    def __init__(self, keys, indptr, titles):
+        self.keys = keys
+        self.indptr = indptr
+        self.titles = titles
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self.keys.find(key) >= 0
+
+    def __getitem__(self, key):
+        key_id = self.keys.find(key)
+        if key_id < 0:
+            raise KeyError(key)
+        return [self.titles[title_id] for title_id in range(self.indptr[key_id], self.indptr[key_id + 1])]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+def saveLookupIndex(path, lookup_dict):
+    all_words = set(lookup_dict)
+    for adjacent_words in lookup_dict.values():
+        all_words.update(adjacent_words)
+    words = sorted(all_words, key=utf8Key)
+    word_ids = dict((word, word_id) for word_id, word in enumerate(words))
+
+    indptr = numpy.zeros(len(words) + 1, dtype=numpy.int64)
+    posting_lists = []
+    for word_id, word in enumerate(words):
+        posting_list = sorted(set(word_ids[adjacent_word] for adjacent_word in lookup_dict.get(word, [])))
+        posting_lists.append(numpy.array(posting_list, dtype=numpy.int32))
+        indptr[word_id + 1] = indptr[word_id] + len(posting_list)
+
+    saveStringTable(path, LOOKUP_WORDS, words)
+    numpy.save(os.path.join(path, LOOKUP_INDPTR_FILE), indptr)
+    numpy.save(os.path.join(path, LOOKUP_INDICES_FILE), numpy.concatenate(posting_lists or [numpy.zeros(0, dtype=numpy.int32)]))
+
+def saveAnagramIndex(path, anagram_dict):
+    keys = sorted(anagram_dict, key=utf8Key)
+    titles = []
+    indptr = numpy.zeros(len(keys) + 1, dtype=numpy.int64)
+    for key_id, key in enumerate(keys):
+        titles.extend(anagram_dict[key])
+        indptr[key_id + 1] = len(titles)
+
+    saveStringTable(path, ANAGRAM_KEYS, keys)
+    numpy.save(os.path.join(path, ANAGRAM_INDPTR_FILE), indptr)
+    saveStringTable(path, ANAGRAM_TITLES, titles)
+
+# Compile titles data (the content of the titles json file) into an index directory
+def compileTitlesIndex(titles_data, path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    dicts = []
+    if "lookupDict" in titles_data:
+        saveLookupIndex(path, titles_data["lookupDict"])
+        dicts.append("lookupDict")
+    if "anagramDict" in titles_data:
+        saveAnagramIndex(path, titles_data["anagramDict"])
+        dicts.append("anagramDict")
+    # meta file is written last, an index without it is incomplete
+    with codecs.open(os.path.join(path, META_FILE), 'w', 'utf-8') as f:
+        json.dump({ 'version': INDEX_VERSION, 'dicts': dicts }, f)
+
+def isTitlesIndex(path):
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+# Load the titles data from an index directory, in the structure of the titles json file
+def loadTitlesIndex(path):
+    with codecs.open(os.path.join(path, META_FILE), 'r', 'utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != INDEX_VERSION:
+        raise IOError("unsupported titles index version in " + path)
+
+    titles_data = {}
+    if "lookupDict" in meta['dicts']:
+        titles_data["lookupDict"] = LookupIndex(loadStringTable(path, LOOKUP_WORDS),
+                                                numpy.load(os.path.join(path, LOOKUP_INDPTR_FILE), mmap_mode='r'),
+                                                numpy.load(os.path.join(path, LOOKUP_INDICES_FILE), mmap_mode='r'))
+    if "anagramDict" in meta['dicts']:
+        titles_data["anagramDict"] = AnagramIndex(loadStringTable(path, ANAGRAM_KEYS),
+                                                  numpy.load(os.path.join(path, ANAGRAM_INDPTR_FILE), mmap_mode='r'),
+                                                  loadStringTable(path, ANAGRAM_TITLES))
+    return titles_data
+
+if __name__ == '__main__':
+    program = os.path.basename(sys.argv[0])
+    logger = logging.getLogger(program)
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
+    logging.root.setLevel(level=logging.INFO)
+    logger.info("running %s" % ' '.join(sys.argv))
+
+    if len(sys.argv) != 3:
+        logger.info("parameters format is wrong - please use:")
+        logger.info("python titles_index.py <titles-dict-json> <titles-index-dir>")
+        raise SystemExit
+
+    titles_file, index_path = sys.argv[1:3]
+
+    logger.info("loading titles dict file... ")
+    with codecs.open(titles_file, 'r', 'utf-8-sig') as f:
+        titles_data = json.load(f)
+
+    logger.info("compiling titles index... ")
+    compileTitlesIndex(titles_data, index_path)
+    logger.info("Finished - titles index was saved into " + index_path)
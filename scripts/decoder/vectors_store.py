@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ Word vectors store - a compact on-disk format of word vectors for the candidates suggester.
+
+ Parsing the text file of the pre-trained vectors (e.g. cc.he.300.vec) takes minutes,
+  and each process of the suggester holds its own private copy of the matrix.
+ The store is a directory which contains:
+     vectors.npy - the vectors matrix normalized to unit length (float32), one row per word.
+     norms.npy - the original length of each vector, needed to restore the raw vectors.
+     vocab.txt - the words, one word per line, in the order of the matrix rows (descending frequency).
+     meta.json - the number of vectors, dimensions and the source file of the store.
+     length-*.* - the vectors bucketed by the length of their words (see similarity_index.py).
+     *-fingerprint.json - the fingerprint of the store which an index of the suggester was derived from.
+
+ The matrix is memory-mapped when the store is loaded, so loading takes seconds,
+  and several suggester processes on the same device share one copy of it in the page cache.
+
+ Conversion of a text file into a store (one time):
+     python vectors_store.py <wordvec-file> <store-dir> [<vectors-limit>]
+"""
+
+import codecs
+import json
+import logging
+import os.path
+import sys
+
+import numpy
+
+STORE_VERSION = 1
+VECTORS_FILE = 'vectors.npy'
+NORMS_FILE = 'norms.npy'
+VOCAB_FILE = 'vocab.txt'
+META_FILE = 'meta.json'
+DERIVED_FINGERPRINT_FILE = '%s-fingerprint.json'
+
+# Return unit vector of the given vector, keeping its dtype
+def unitVector(vector):
+    norm = numpy.sqrt(numpy.dot(vector, vector))
+    if norm > 0:
+        return (vector / norm).astype(vector.dtype)
+    return vector
+
+# Indices of the topn largest values, in descending order of the values
+def topIndices(dists, topn):
+    if topn >= len(dists):
+        return numpy.argsort(dists)[::-1]
+    best = numpy.argpartition(dists, -topn)[-topn:]
+    return best[numpy.argsort(dists[best])[::-1]]
+
+# topIndices of each row of a scores matrix
+def topIndicesOfRows(scores, topn):
+    topn = min(topn, scores.shape[1])
+    if topn == 0:
+        return numpy.zeros((scores.shape[0], 0), dtype=numpy.int64)
+    best = numpy.argpartition(scores, -topn, axis=1)[:, -topn:]
+    order = numpy.argsort(numpy.take_along_axis(scores, best, axis=1), axis=1)[:, ::-1]
+    return numpy.take_along_axis(best, order, axis=1)
+
+"""
+ Word vectors which are backed by a store.
+ The class implements the part of gensim KeyedVectors that is used by the suggester
+ (vocab, index2word, vectors_norm, most_similar, most_similar_cosmul and n_similarity),
+ with the same results, so both can be used by the similarity services.
+"""
+class StoredVectors(object):
+    def __init__(self, vectors_norm, norms, index2word):
+        self.vectors_norm = vectors_norm
+        self.norms = norms
+        self.index2word = index2word
+        self.vocab = dict((word, index) for index, word in enumerate(index2word))
+        self.vector_size = vectors_norm.shape[1]
+
+    # The vectors are normalized in advance, kept for compatibility with KeyedVectors
+    def init_sims(self, replace=False):
+        pass
+
+    def wordIndex(self, word):
+        if word not in self.vocab:
+            raise KeyError("word '%s' not in vocabulary" % word)
+        return self.vocab[word]
+
+    # The raw (not normalized) vectors of the words
+    def rawVectors(self, words):
+        indices = [self.wordIndex(word) for word in words]
+        return self.vectors_norm[indices] * self.norms[indices][:, numpy.newaxis]
+
+    def most_similar(self, positive, topn=10):
+        if not positive:
+            raise ValueError("cannot compute similarity with no input")
+        indices = [self.wordIndex(word) for word in positive]
+        mean = unitVector(self.vectors_norm[indices].mean(axis=0))
+        dists = self.vectors_norm.dot(mean)
+        return self.bestWords(dists, set(indices), topn)
+
+    # 3CosMul without negative words, see gensim KeyedVectors.most_similar_cosmul
+    def most_similar_cosmul(self, positive, topn=10):
+        if not positive:
+            raise ValueError("cannot compute similarity with no input")
+        indices = [self.wordIndex(word) for word in positive]
+        pos_dists = [((1 + self.vectors_norm.dot(self.vectors_norm[index])) / 2) for index in indices]
+        dists = numpy.prod(pos_dists, axis=0) / (1 + 0.000001)
+        return self.bestWords(dists, set(indices), topn)
+
+    def n_similarity(self, ws1, ws2):
+        if not (len(ws1) and len(ws2)):
+            raise ZeroDivisionError('At least one of the passed list is empty.')
+        v1 = unitVector(self.rawVectors(ws1).mean(axis=0))
+        v2 = unitVector(self.rawVectors(ws2).mean(axis=0))
+        return numpy.dot(v1, v2)
+
+    def bestWords(self, dists, ignored_indices, topn):
+        best = topIndices(dists, topn + len(ignored_indices))
+        result = [(self.index2word[index], float(dists[index])) for index in best if index not in ignored_indices]
+        return result[:topn]
+
+def isStore(path):
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+# Load a store, the matrix is memory-mapped (read only) and isn't copied into the process memory
+def loadStore(path, limit=None):
+    with codecs.open(os.path.join(path, META_FILE), 'r', 'utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != STORE_VERSION:
+        raise IOError("unsupported word vectors store version in " + path)
+
+    vectors_norm = numpy.load(os.path.join(path, VECTORS_FILE), mmap_mode='r')
+    norms = numpy.load(os.path.join(path, NORMS_FILE), mmap_mode='r')
+    with codecs.open(os.path.join(path, VOCAB_FILE), 'r', 'utf-8') as f:
+        index2word = f.read().split('\n')[:meta['count']]
+
+    if limit:
+        # slicing a memory-mapped array doesn't copy it
+        vectors_norm = vectors_norm[:limit]
+        norms = norms[:limit]
+        index2word = index2word[:limit]
+    return StoredVectors(vectors_norm, norms, index2word)
+
+def saveStore(path, vectors, index2word, source):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    vectors = numpy.asarray(vectors, dtype=numpy.float32)
+    norms = numpy.sqrt((vectors * vectors).sum(axis=1))
+    vectors_norm = vectors / numpy.where(norms > 0, norms, 1)[:, numpy.newaxis]
+
+    numpy.save(os.path.join(path, VECTORS_FILE), numpy.ascontiguousarray(vectors_norm, dtype=numpy.float32))
+    numpy.save(os.path.join(path, NORMS_FILE), norms.astype(numpy.float32))
+    with codecs.open(os.path.join(path, VOCAB_FILE), 'w', 'utf-8') as f:
+        f.write('\n'.join(index2word) + '\n')
+    # meta file is written last, a store without it is incomplete
+    meta = { 'version': STORE_VERSION, 'count': len(index2word), 'dimensions': vectors.shape[1],
+             'source': os.path.basename(source) }
+    with codecs.open(os.path.join(path, META_FILE), 'w', 'utf-8') as f:
+        json.dump(meta, f)
+
+# Identifies the vectors of a store, a store which is written again (in place) gets a new fingerprint
+def storeFingerprint(path):
+    with codecs.open(os.path.join(path, META_FILE), 'r', 'utf-8') as f:
+        meta = json.load(f)
+    stat = os.stat(os.path.join(path, VECTORS_FILE))
+    return '%d:%d:%d:%d' % (meta['count'], meta['dimensions'], stat.st_size, stat.st_mtime_ns)
+
+# Indexes that the suggester derives from a store and saves into it (quantized vectors, IVF lists, ...)
+# are saved with the fingerprint of the store, and they are built again if the store was changed since.
+# The fingerprint is written after the files of the index, so an interrupted save is built again too.
+def isDerivedFresh(path, name):
+    fingerprint_file = os.path.join(path, DERIVED_FINGERPRINT_FILE % name)
+    if not os.path.isfile(fingerprint_file):
+        return False
+    with codecs.open(fingerprint_file, 'r', 'utf-8') as f:
+        return json.load(f).get('store') == storeFingerprint(path)
+
+def saveDerivedFingerprint(path, name):
+    with codecs.open(os.path.join(path, DERIVED_FINGERPRINT_FILE % name), 'w', 'utf-8') as f:
+        json.dump({ 'store': storeFingerprint(path) }, f)
+
+# Convert word vectors text file (word2vec format) into a store
+def convertTextToStore(wv_file, store_path, limit=None):
+    from gensim.models.keyedvectors import KeyedVectors
+    word_vectors = KeyedVectors.load_word2vec_format(wv_file, binary=False, limit=limit)
+    saveStore(store_path, word_vectors.vectors, word_vectors.index2word, wv_file)
+    return len(word_vectors.index2word)
+
+if __name__ == '__main__':
+    program = os.path.basename(sys.argv[0])
+    logger = logging.getLogger(program)
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
+    logging.root.setLevel(level=logging.INFO)
+    logger.info("running %s" % ' '.join(sys.argv))
+
+    if len(sys.argv) not in (3, 4):
+        logger.info("parameters format is wrong - please use:")
+        logger.info("python vectors_store.py <wordvec-file> <store-dir> [<vectors-limit>]")
+        raise SystemExit
+
+    wv_file, store_path = sys.argv[1:3]
+    wv_limit = int(sys.argv[3]) if len(sys.argv) == 4 else None
+
+    logger.info("converting word vectors file... ")
+    count = convertTextToStore(wv_file, store_path, wv_limit)
+
+    logger.info("building length index... ")
+    from similarity_index import buildLengthIndex, saveLengthIndex
+    saveLengthIndex(store_path, buildLengthIndex(loadStore(store_path)))
+    logger.info("Finished - saved " + str(count) + " vectors into " + store_path)
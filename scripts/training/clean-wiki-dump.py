@@ -2,18 +2,163 @@
 # -*- coding: utf-8 -*-
 """
 This code is based on https://github.com/panyang/Wikipedia_Word2vec by Pan Yang, 2017 - MIT license
-I changed it so the encoding wiil work, and I checked it for both py2.7 (terminal) and py3.6 (IPython console).
+I changed it so the encoding wiil work, and I checked it for py3.6 (terminal and IPython console).
 Performances can vary based on the compilers installed on the machine, etc.
+
+Pipeline mode - when the number of processes is given, the dump is split into batches of pages,
+ which are cleaned by a pool of processes. The cleaned articles are written into ordered shards
+ in the <output>.shards directory, and a checkpoint is saved after each shard.
+ An interrupted run that is started again with the same parameters continues after the last saved shard
+ (the pages of the saved shards are read again from the dump, but they are not cleaned).
+ When all the pages are cleaned, the shards are joined into the output file, which is the same as the output of a regular run,
+  and the shards directory can be deleted.
+     python clean-wiki-dump.py xx-wiki.xxx.xml.bz2 wiki.xx.text <processes> [<batch-pages>]
 """
 
 from __future__ import print_function
 
+import bz2
+import codecs
+import json
 import logging
+import multiprocessing
 import os.path
+import shutil
 import six
 import sys
+import time
 
 from gensim.corpora import WikiCorpus
+from gensim.corpora.wikicorpus import extract_pages, filter_wiki, tokenize, IGNORED_NAMESPACES, ARTICLE_MIN_WORDS
+
+# Number of pages that are sent together to a cleaning process
+DEFAULT_BATCH_PAGES = 500
+# Number of batches in each output shard, a checkpoint is saved after each shard
+SHARD_BATCHES = 40
+CHECKPOINT_FILE = 'checkpoint.json'
+SHARD_FILE = 'shard-%05d.txt'
+
+# Clean the pages of a batch in the same way of WikiCorpus.get_texts (main namespace, without lemmatization),
+# returns the lines of the articles and the cleaning time
+def cleanBatch(pages):
+    start = time.time()
+    articles = []
+    for title, text in pages:
+        tokens = tokenize(filter_wiki(text))
+        # article redirects and short stubs are pruned
+        if len(tokens) < ARTICLE_MIN_WORDS or any(title.startswith(ignore + ':') for ignore in IGNORED_NAMESPACES):
+            continue
+        articles.append(' '.join(tokens))
+    return articles, time.time() - start
+
+# Lists of batch_pages pages (title, text) of the dump, the first skip_pages pages are skipped
+def pagesBatches(input_dump, batch_pages, skip_pages):
+    batch = []
+    for page_number, (title, text, _) in enumerate(extract_pages(bz2.BZ2File(input_dump), ('0',))):
+        if page_number < skip_pages:
+            continue
+        batch.append((title, text))
+        if len(batch) == batch_pages:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def shardsBatches(batches):
+    shard = []
+    for batch in batches:
+        shard.append(batch)
+        if len(shard) == SHARD_BATCHES:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+# The checkpoint of the shards directory, or a new one if it doesn't exist or was saved with other parameters
+def loadCheckpoint(shards_dir, input_dump, batch_pages):
+    new_checkpoint = { 'dump': os.path.abspath(input_dump), 'dumpSize': os.path.getsize(input_dump), 'batchPages': batch_pages,
+                       'shards': 0, 'pages': 0, 'articles': 0, 'finished': False }
+    checkpoint_path = os.path.join(shards_dir, CHECKPOINT_FILE)
+    if os.path.isfile(checkpoint_path):
+        with codecs.open(checkpoint_path, 'r', 'utf-8') as f:
+            checkpoint = json.load(f)
+        if all(checkpoint.get(key) == new_checkpoint[key] for key in ('dump', 'dumpSize', 'batchPages')):
+            return checkpoint
+    return new_checkpoint
+
+# The checkpoint is replaced at once, so an interrupted save keeps the previous checkpoint
+def saveCheckpoint(shards_dir, checkpoint):
+    checkpoint_path = os.path.join(shards_dir, CHECKPOINT_FILE)
+    with codecs.open(checkpoint_path + '.tmp', 'w', 'utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+def writeShard(shards_dir, shard_number, articles):
+    shard_path = os.path.join(shards_dir, SHARD_FILE % shard_number)
+    with codecs.open(shard_path + '.tmp', 'w', 'utf-8') as f:
+        for article in articles:
+            f.write(article + "\n")
+    os.replace(shard_path + '.tmp', shard_path)
+
+def joinShards(shards_dir, shards, output_text):
+    with open(output_text, 'wb') as output:
+        for shard_number in range(shards):
+            with open(os.path.join(shards_dir, SHARD_FILE % shard_number), 'rb') as f:
+                shutil.copyfileobj(f, output)
+
+# Clean the dump in a pool of processes. While a shard is cleaned, the pages of the next shard are read from the dump.
+def cleanInPipeline(input_dump, output_text, processes, batch_pages, logger):
+    shards_dir = output_text + '.shards'
+    if not os.path.isdir(shards_dir):
+        os.makedirs(shards_dir)
+    checkpoint = loadCheckpoint(shards_dir, input_dump, batch_pages)
+    if checkpoint['finished']:
+        logger.info("the dump was already cleaned into " + output_text)
+        return checkpoint['articles']
+    if checkpoint['shards']:
+        logger.info("resuming after %d shards - %d pages, %d articles" % (checkpoint['shards'], checkpoint['pages'], checkpoint['articles']))
+
+    start = time.time()
+    resumed_pages, resumed_articles = checkpoint['pages'], checkpoint['articles']
+    # cleaning time of each batch in the processes
+    batches_times = []
+
+    # the results of the previous shard are written after the current shard is sent to the pool
+    def finishShard(shard_pages, results):
+        cleaned_batches = results.get()
+        articles = [article for batch_articles, _ in cleaned_batches for article in batch_articles]
+        batches_times.extend(seconds for _, seconds in cleaned_batches)
+        writeShard(shards_dir, checkpoint['shards'], articles)
+        checkpoint['shards'] += 1
+        checkpoint['pages'] += shard_pages
+        checkpoint['articles'] += len(articles)
+        saveCheckpoint(shards_dir, checkpoint)
+
+        elapsed = time.time() - start
+        articles_rate = (checkpoint['articles'] - resumed_articles) / elapsed
+        pages_rate = (checkpoint['pages'] - resumed_pages) / elapsed
+        logger.info("Saved shard %d - %d articles (%.1f articles/s, %.1f pages/s, %.1f articles/s per process, processes busy %.0f%%)" %
+                    (checkpoint['shards'], checkpoint['articles'], articles_rate, pages_rate, articles_rate / processes,
+                     100 * sum(batches_times) / (elapsed * processes)))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        pending = None
+        for shard in shardsBatches(pagesBatches(input_dump, batch_pages, checkpoint['pages'])):
+            results = pool.map_async(cleanBatch, shard, chunksize=1)
+            if pending is not None:
+                finishShard(*pending)
+            pending = (sum(len(batch) for batch in shard), results)
+        if pending is not None:
+            finishShard(*pending)
+    finally:
+        pool.terminate()
+
+    logger.info("joining %d shards into %s" % (checkpoint['shards'], output_text))
+    joinShards(shards_dir, checkpoint['shards'], output_text)
+    checkpoint['finished'] = True
+    saveCheckpoint(shards_dir, checkpoint)
+    return checkpoint['articles']
 
 if __name__ == '__main__':
     program = os.path.basename(sys.argv[0])
@@ -25,15 +170,23 @@ if __name__ == '__main__':
     logger.info("running %s" % ' '.join(sys.argv))
 
     # Parameters for the script
-    if len(sys.argv) != 3:
+    if len(sys.argv) not in (3, 4, 5):
         print("The script receives 2 parameters: input - xml.bz2 dump file, and output path. Cleaning can take several hours.")
         print("Use: python clean_wiki.py xx-wiki.xxx.xml.bz2 wiki.xx.text")
+        print("Or clean in several processes, and continue an interrupted run: python clean_wiki.py xx-wiki.xxx.xml.bz2 wiki.xx.text <processes> [<batch-pages>]")
         sys.exit(1)
         
     # input_dump = '../wiki-he/hewiki-20180701-pages-meta-current.xml.bz2'
     # output_text = '../wiki-he/wiki.he.text'
     input_dump, output_text = sys.argv[1:3]
 
+    if len(sys.argv) > 3:
+        processes = int(sys.argv[3])
+        batch_pages = int(sys.argv[4]) if len(sys.argv) == 5 else DEFAULT_BATCH_PAGES
+        articles = cleanInPipeline(input_dump, output_text, processes, batch_pages, logger)
+        logger.info("Finished - Saved " + str(articles) + " articles")
+        sys.exit(0)
+
     output = open(output_text, 'w')
     
     # Extract wiki page content from the xml-dump file using gensim and clean it from wikimedia meta-chars, without lemmatization
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+ Pre-tokenized corpus cache for training several word vectors models on the same cleaned wiki text.
+
+ Reading the text with LineSentence splits every line again in every epoch, and every model scans
+  the whole text for its vocabulary before it is trained. The cache is built once, and contains:
+     vocab.txt - the words with at least MIN_COUNT occurrences, one word per line, in descending count.
+     counts.npy - the count of each word of the vocabulary (int64).
+     ids.npy - the words of all the sentences as ids in the vocabulary (uint32), words under MIN_COUNT are dropped.
+     offsets.npy - the start of each sentence (line of the text) in ids, and the end of the last sentence (int64).
+     meta.json - the source text, the minimal count, and the number of sentences and words.
+
+ The dropped words don't change the training - the trainers skip words which are not in the vocabulary
+  before they build the windows of a sentence. The models use min_count = MIN_COUNT, so the counts of the cache
+  are their vocabulary (see build_vocab_from_freq of gensim).
+ The arrays are memory-mapped when the cache is loaded.
+"""
+
+import codecs
+import collections
+import json
+import os.path
+
+import numpy
+
+MIN_COUNT = 5
+VOCAB_FILE = 'vocab.txt'
+COUNTS_FILE = 'counts.npy'
+IDS_FILE = 'ids.npy'
+OFFSETS_FILE = 'offsets.npy'
+META_FILE = 'meta.json'
+
+# Number of lines between progress messages
+PROGRESS_LINES = 100000
+
+def isCorpusCache(path):
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+# Two passes over the text - the first counts the words, the second writes the ids of the vocabulary words
+def buildCorpusCache(text_file, cache_dir, logger, min_count=MIN_COUNT):
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    counts = collections.Counter()
+    sentences = 0
+    with codecs.open(text_file, 'r', 'utf-8') as f:
+        for line in f:
+            counts.update(line.split())
+            sentences += 1
+            if sentences % PROGRESS_LINES == 0:
+                logger.info("counted the words of %d lines, %d unique words" % (sentences, len(counts)))
+
+    # descending count, and the order of the first occurrence for equal counts (as the vocabulary of gensim)
+    index2word = [word for word, count in counts.most_common() if count >= min_count]
+    word_counts = numpy.array([counts[word] for word in index2word], dtype=numpy.int64)
+    del counts
+    vocab = dict((word, index) for index, word in enumerate(index2word))
+    logger.info("%d sentences, %d words in the vocabulary" % (sentences, len(index2word)))
+
+    ids = numpy.lib.format.open_memmap(os.path.join(cache_dir, IDS_FILE), mode='w+', dtype=numpy.uint32,
+                                       shape=(int(word_counts.sum()),))
+    offsets = numpy.zeros(sentences + 1, dtype=numpy.int64)
+    position = 0
+    with codecs.open(text_file, 'r', 'utf-8') as f:
+        for sentence, line in enumerate(f):
+            sentence_ids = [vocab[word] for word in line.split() if word in vocab]
+            ids[position:position + len(sentence_ids)] = sentence_ids
+            position += len(sentence_ids)
+            offsets[sentence + 1] = position
+            if (sentence + 1) % PROGRESS_LINES == 0:
+                logger.info("wrote the ids of %d lines" % (sentence + 1))
+    ids.flush()
+    del ids
+
+    numpy.save(os.path.join(cache_dir, OFFSETS_FILE), offsets)
+    numpy.save(os.path.join(cache_dir, COUNTS_FILE), word_counts)
+    with codecs.open(os.path.join(cache_dir, VOCAB_FILE), 'w', 'utf-8') as f:
+        f.write('\n'.join(index2word) + '\n')
+    # meta file is written last, a cache without it is incomplete
+    meta = { 'source': os.path.basename(text_file), 'minCount': min_count, 'sentences': sentences,
+             'words': position, 'vocabulary': len(index2word) }
+    with codecs.open(os.path.join(cache_dir, META_FILE), 'w', 'utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+"""
+ The sentences of a corpus cache - an iterable of lists of words, which can be iterated many times
+ (for the vocabulary and for each epoch), as LineSentence.
+"""
+class CachedCorpus(object):
+    def __init__(self, cache_dir):
+        with codecs.open(os.path.join(cache_dir, META_FILE), 'r', 'utf-8') as f:
+            self.meta = json.load(f)
+        with codecs.open(os.path.join(cache_dir, VOCAB_FILE), 'r', 'utf-8') as f:
+            self.index2word = f.read().split('\n')[:self.meta['vocabulary']]
+        self.counts = numpy.load(os.path.join(cache_dir, COUNTS_FILE))
+        self.ids = numpy.load(os.path.join(cache_dir, IDS_FILE), mmap_mode='r')
+        self.offsets = numpy.load(os.path.join(cache_dir, OFFSETS_FILE))
+        # the words as an array, so the words of a sentence are taken by its ids at once
+        self.words = numpy.array(self.index2word, dtype=object)
+
+    def __len__(self):
+        return self.meta['sentences']
+
+    def __iter__(self):
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield self.words[self.ids[start:end]].tolist()
+
+    # word: count of the vocabulary, for build_vocab_from_freq
+    def wordCounts(self):
+        return dict(zip(self.index2word, self.counts.tolist()))
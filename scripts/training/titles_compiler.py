@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ Titles dictionaries compiler - builds the titles dictionaries of the suggester from the titles dump
+  (list of page titles in main namespace), as the titles-cleaner JS app does, directly into a compiled titles index.
+
+ The dump is read line by line, and each title is cleaned by the same rules of the titles-cleaner:
+     lookupDict - the first two words of a title (Hebrew letters only, without diacritic symbols, the second word isn't
+      in brackets or a stop word) are adjacent words of each other.
+     anagramDict - the title words up to the first word which isn't Hebrew (the second word can be a digit,
+      which is written in Hebrew letters), keyed by their sorted letters in regular form (without final letters).
+ The adjacent words and the titles of each key are kept as ordered sets, so each insertion is checked by hashing.
+ The dictionaries are saved as a titles index directory (see scripts/decoder/titles_index.py), which is
+  memory-mapped by the suggester instead of loading a json file.
+
+     python titles_compiler.py <titles-dump-file> <titles-index-dir>
+"""
+
+import logging
+import os.path
+import re
+import sys
+
+# the titles index is loaded by the decoder's module
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'decoder'))
+from titles_index import compileTitlesIndex
+
+# the Hebrew letters, including the final letters, are the range א-ת
+HEBREW_WORD = re.compile('[א-ת]*')
+# regular form of the final letters, and spaces are removed
+ANAGRAM_FORM = dict([(ord(' '), None)] + [(ord(final), regular) for final, regular in
+                                            [('ם', 'מ'), ('ן', 'נ'), ('ץ', 'צ'), ('ף', 'פ'), ('ך', 'כ')]])
+DIACRITIC_SYMBOLS = re.compile('[\'"״׳`]')
+STOP_WORDS = ('של', 'או', '-')
+# Use feminine form (in some cases it's should be in a masculine form, ignore them)
+DIGITS_WORDS = { '1': 'אחת', '2': 'שתיים', '3': 'שלוש', '4': 'ארבע', '5': 'חמש',
+                 '6': 'שש', '7': 'שבע', '8': 'שמונה', '9': 'תשע', '0': 'אפס' }
+
+# Number of lines between progress messages
+PROGRESS_LINES = 200000
+
+def cleanDiacriticHebrewSymbols(word):
+    return DIACRITIC_SYMBOLS.sub('', word)
+
+def isWordInHebrewAlphabetCharacters(word):
+    return HEBREW_WORD.fullmatch(word) is not None
+
+def isStopWord(word, sentence_length):
+    return sentence_length != 2 and word in STOP_WORDS
+
+# The words of a title without diacritic symbols (the symbols aren't '_', so they are removed from the whole line)
+def titleWords(line):
+    return cleanDiacriticHebrewSymbols(line).split('_')
+
+# The first two words of a title for the lookup dict, or None if the title isn't lookupable
+def lookupWords(words):
+    if (len(words) > 1 and not words[1].startswith('(') and
+            isWordInHebrewAlphabetCharacters(words[0]) and isWordInHebrewAlphabetCharacters(words[1]) and
+            not isStopWord(words[1], len(words))):
+        return words[0], words[1]
+    return None
+
+# The words of a title until a word with non-Hebrew letter, the second word can be a digit
+def cleanTitle(words):
+    clean_words = []
+    for i, word in enumerate(words):
+        if i == 1 and word in DIGITS_WORDS:
+            clean_words.append(DIGITS_WORDS[word])
+        elif isWordInHebrewAlphabetCharacters(word):
+            clean_words.append(word)
+        else:
+            break
+    return ' '.join(clean_words)
+
+# Letters of the title without spaces, in regular form, sorted
+def anagramSortedForm(title):
+    return ''.join(sorted(title.translate(ANAGRAM_FORM)))
+
+# The lines of the dump as the JS app splits them - only by '\n', and with an empty line after a final '\n'
+def titlesLines(titles_file):
+    last_line = b'\n'
+    with open(titles_file, 'rb') as f:
+        for last_line in f:
+            yield last_line.rstrip(b'\n').decode('utf-8', 'replace')
+    if last_line.endswith(b'\n'):
+        yield ''
+
+# word: ordered set (dict with None values) of adjacent words, sorted letters: ordered set of titles
+def buildTitlesDicts(titles_file, logger):
+    lookup_dict, anagram_dict = {}, {}
+    for line_number, line in enumerate(titlesLines(titles_file)):
+        words = titleWords(line)
+        adjacent_words = lookupWords(words)
+        if adjacent_words is not None:
+            first_word, second_word = adjacent_words
+            lookup_dict.setdefault(first_word, {})[second_word] = None
+            lookup_dict.setdefault(second_word, {})[first_word] = None
+
+        title = cleanTitle(words)
+        anagram_dict.setdefault(anagramSortedForm(title), {})[title] = None
+
+        if (line_number + 1) % PROGRESS_LINES == 0:
+            logger.info("read %d titles - %d lookup words, %d anagram keys" % (line_number + 1, len(lookup_dict), len(anagram_dict)))
+    return { 'lookupDict': lookup_dict, 'anagramDict': anagram_dict }
+
+if __name__ == '__main__':
+    program = os.path.basename(sys.argv[0])
+    logger = logging.getLogger(program)
+    logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s')
+    logging.root.setLevel(level=logging.INFO)
+    logger.info("running %s" % ' '.join(sys.argv))
+
+    if len(sys.argv) != 3:
+        logger.info("parameters format is wrong - please use:")
+        logger.info("python titles_compiler.py <titles-dump-file> <titles-index-dir>")
+        raise SystemExit
+
+    titles_file, index_path = sys.argv[1:3]
+
+    logger.info("building titles dicts... ")
+    titles_data = buildTitlesDicts(titles_file, logger)
+
+    logger.info("compiling titles index... ")
+    compileTitlesIndex(titles_data, index_path)
+    logger.info("Finished - titles index was saved into " + index_path)
@@ -1,19 +1,81 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-    Training script - creates fastText or word2vec vectors, 
+    Training script - creates fastText or word2vec vectors,
+
+    Grid sweeps over the same corpus - the cleaned text is converted once into a corpus cache (see corpus_cache.py),
+    and then several configurations are trained on it back to back, without reading the text and scanning its vocabulary again.
+    The vectors of each configuration are saved as a word vectors store of the suggester (see scripts/decoder/vectors_store.py):
+        python train_wv.py prepare <wiki_text_he> <corpus-cache-dir>
+        python train_wv.py sweep <corpus-cache-dir> <output-dir> <wv-format>:<vector-size>:<window> [...]
 """
 
 import logging
 import multiprocessing
 import os.path
 import sys
+import time
 
 from gensim.models.word2vec import Word2Vec
 from gensim.models.word2vec import LineSentence
 
 from gensim.models import FastText
 
+from corpus_cache import buildCorpusCache, CachedCorpus, isCorpusCache, MIN_COUNT
+
+# the word vectors store is written by the decoder's module
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'decoder'))
+from vectors_store import saveStore, loadStore
+from similarity_index import buildLengthIndex, saveLengthIndex
+
+# ft = fasttext with default parameters, w2v = gensim word2vec
+# Without sentences the model isn't trained, and its vocabulary should be built before training
+def createModel(wv_format, vectors_size, window_size, sentences=None):
+    if wv_format == "ft":
+        return FastText(sentences, size=vectors_size, window=window_size, min_count=MIN_COUNT, sample=0.0001, min_n=3, max_n=6, iter=5, workers=multiprocessing.cpu_count())
+    elif wv_format == "w2v":
+        return Word2Vec(sentences, size=vectors_size, window=window_size, min_count=MIN_COUNT, workers=multiprocessing.cpu_count())
+    return None
+
+# Parse <wv-format>:<vector-size>:<window>, returns None if the configuration is invalid
+def parseConfiguration(configuration):
+    parts = configuration.split(':')
+    if len(parts) != 3 or parts[0] not in ("ft", "w2v") or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return parts[0], int(parts[1]), int(parts[2])
+
+# The vocabulary is built from the counts of the cache, instead of a scan of the corpus
+def trainOnCorpusCache(corpus, wv_format, vectors_size, window_size):
+    model = createModel(wv_format, vectors_size, window_size)
+    model.build_vocab_from_freq(corpus.wordCounts(), corpus_count=len(corpus))
+    model.train(corpus, total_examples=len(corpus), epochs=model.epochs)
+    return model
+
+# Save the (normalized) vectors as a word vectors store with its length index, which the suggester loads in seconds
+def exportStore(model, store_path, source):
+    saveStore(store_path, model.wv.vectors, model.wv.index2word, source)
+    saveLengthIndex(store_path, buildLengthIndex(loadStore(store_path)))
+
+def sweep(cache_dir, output_dir, configurations, logger):
+    corpus = CachedCorpus(cache_dir)
+    logger.info("corpus cache of %d sentences, %d words, %d words in the vocabulary" %
+                (corpus.meta['sentences'], corpus.meta['words'], corpus.meta['vocabulary']))
+    for wv_format, vectors_size, window_size in configurations:
+        start = time.time()
+        logger.info("training %s - vector size %d, window %d" % (wv_format, vectors_size, window_size))
+        model = trainOnCorpusCache(corpus, wv_format, vectors_size, window_size)
+        # trim unneeded model memory = use (much) less RAM
+        model.init_sims(replace=True)
+        store_path = os.path.join(output_dir, '%s-%d-%d' % (wv_format, vectors_size, window_size))
+        exportStore(model, store_path, corpus.meta['source'])
+        del model
+        logger.info("%s was saved (%.1f minutes)" % (store_path, (time.time() - start) / 60))
+
+def logUsage(logger):
+    logger.info("parameters format is wrong - please use:")
+    logger.info("python train_word2vec.py <wv-format> <wiki_text_he> <vector-size> <window> <wv_output_path>")
+    logger.info("or: python train_wv.py prepare <wiki_text_he> <corpus-cache-dir>")
+    logger.info("and: python train_wv.py sweep <corpus-cache-dir> <output-dir> <wv-format>:<vector-size>:<window> [...]")
 
 if __name__ == '__main__':
     program = os.path.basename(sys.argv[0])
@@ -23,10 +85,23 @@ if __name__ == '__main__':
     logging.root.setLevel(level=logging.INFO)
     logger.info("running %s" % ' '.join(sys.argv))
 
+    if len(sys.argv) == 4 and sys.argv[1] == 'prepare':
+        meta = buildCorpusCache(sys.argv[2], sys.argv[3], logger)
+        logger.info("Finished - saved %d sentences into %s" % (meta['sentences'], sys.argv[3]))
+        raise SystemExit
+
+    if len(sys.argv) >= 5 and sys.argv[1] == 'sweep':
+        configurations = [parseConfiguration(configuration) for configuration in sys.argv[4:]]
+        if None in configurations or not isCorpusCache(sys.argv[2]):
+            logUsage(logger)
+            raise SystemExit
+        sweep(sys.argv[2], sys.argv[3], configurations, logger)
+        logger.info("Finished - trained %d configurations" % len(configurations))
+        raise SystemExit
+
     # wiki input is a "clean" text file without metadata of wikimedia and punctuation. See the cleaning script.
     if len(sys.argv) != 6:
-       logger.info("parameters format is wrong - please use:")
-       logger.info("python train_word2vec.py <wv-format> <wiki_text_he> <vector-size> <window> <wv_output_path>")
+       logUsage(logger)
        raise SystemExit
 
     wiki_text_input = sys.argv[1]
@@ -34,16 +109,12 @@ if __name__ == '__main__':
     vectors_size = int(sys.argv[3])
     window_size = int(sys.argv[4])
     output_path = sys.argv[5]
-    
-    # ft = fasttext with default parameters, w2v = gensim word2vec
-    if wv_format == "ft":
-        model = FastText(LineSentence(wiki_text_input, max_sentence_length=10000000), size=vectors_size, window=window_size, min_count=5, sample=0.0001, min_n=3, max_n=6, iter=5, workers=multiprocessing.cpu_count())
-    elif wv_format == "w2v":
-        model = Word2Vec(LineSentence(wiki_text_input, max_sentence_length=10000000), size=vectors_size, window=window_size, min_count=5, workers=multiprocessing.cpu_count())
-    else:
+
+    model = createModel(wv_format, vectors_size, window_size, LineSentence(wiki_text_input, max_sentence_length=10000000))
+    if model is None:
         logger.info("Word vectors format it invalid, choose 'ft' for pretrained fastext or 'w2v' for traind word2vec")
         raise SystemExit
-        
+
     # trim unneeded model memory = use (much) less RAM
     model.init_sims(replace=True)
-    model.wv.save_word2vec_format(output_path)
\ No newline at end of file
+    model.wv.save_word2vec_format(output_path)